@@ -0,0 +1,71 @@
+"""When the receiver acks: every segment, every N segments, or after a delay.
+
+Following RFC 5681 section 4.2, an ack goes out right away for anything
+the sender needs to hear about quickly: a segment that arrived out of
+order, one that fills a hole, a duplicate, or the end of the transfer.
+In-order segments are acked every N and a delayed-ack timer makes sure
+none of them waits longer than the configured delay.
+"""
+
+# segments acked together by default, 1 acks every segment like the stock receiver
+ACK_EVERY = 1
+# longest an in-order segment may wait for its ack, in seconds
+ACK_DELAY = 0.04
+# shortest socket timeout handed out, settimeout(0) would make the socket non-blocking
+MIN_WAIT = 0.001
+
+
+class AckPolicy:
+    """Decides which arrivals get an ack and counts what was sent."""
+
+    def __init__(self, every=ACK_EVERY, delay=ACK_DELAY):
+        self.every = every
+        self.delay = delay
+        self.unacked = 0  # in-order segments since the last ack
+        self.deadline = None  # when the delayed-ack timer fires
+
+        self.segments = 0
+        self.acks_sent = 0
+        self.immediate_acks = 0  # sent because of a gap, a duplicate or the end
+        self.delayed_acks = 0  # sent because the timer fired
+
+    def on_segment(self, now, immediate=False):
+        """a segment arrived, True if it should be acked now."""
+        self.segments += 1
+        if immediate:
+            self.immediate_acks += 1
+            return True
+        self.unacked += 1
+        if self.unacked >= self.every:
+            return True
+        if self.deadline is None:
+            self.deadline = now + self.delay
+        return False
+
+    def hold(self, now):
+        """a segment arrived whose ack waits for something else (see fec.py), at most until the timer fires."""
+        self.segments += 1
+        if self.deadline is None:
+            self.deadline = now + self.delay
+
+    def wait_time(self, now):
+        """seconds until the delayed-ack timer fires, None when nothing is waiting."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - now, MIN_WAIT)
+
+    def on_timer(self, now):
+        """True if the delayed-ack timer fired and an ack is due."""
+        if self.deadline is None or now < self.deadline:
+            return False
+        self.delayed_acks += 1
+        return True
+
+    def on_ack_sent(self):
+        self.acks_sent += 1
+        self.unacked = 0
+        self.deadline = None
+
+    def summary(self):
+        return (f"ACKs sent: {self.acks_sent} for {self.segments} segments "
+                f"(immediate {self.immediate_acks}, delayed {self.delayed_acks})")
@@ -0,0 +1,111 @@
+"""Per-ack event trace of a transfer in fixed-width binary records.
+
+The runtime hands the tracer one record per event: every ack, every
+fast retransmit and timeout, and every segment resent on its own. A
+record is the time since the first one, the event, the sequence id, cwnd
+and ssthresh in bytes, the bytes in flight and the rtt sample (NaN when
+the ack gave none). Records are packed with struct into a preallocated
+buffer and written out each time it fills, so tracing costs one
+pack_into per event and no per-event objects.
+
+The file is a version 1.0 .npy of a structured array: numpy.load gives
+the records as they are (trace["cwnd"], trace["time"], ...), and load()
+here reads them without NumPy. The header is padded to a fixed size and
+rewritten with the record count on close; a trace whose sender died
+before that still loads, its count is taken from the file size.
+
+    python3 sender_reno.py --trace reno.npy
+    python3 plot_trace.py reno.npy
+"""
+import ast
+import collections
+import contextlib
+import math
+import struct
+
+ACK = 0
+DUP_ACK = 1  # an ack that did not move the window
+FAST_RETRANSMIT = 2  # dup acks (or a partial ack) said seq is lost
+TIMEOUT = 3  # the retransmission timer fired, seq is the first unacked byte
+RETRANSMIT = 4  # one segment sent again on its own
+EVENTS = {ACK: 'ack', DUP_ACK: 'dup ack', FAST_RETRANSMIT: 'fast retransmit', TIMEOUT: 'timeout',
+          RETRANSMIT: 'retransmit'}
+
+# little-endian and packed, the same layout as DTYPE
+RECORD = struct.Struct('<dBqddqd')
+FIELDS = ('time', 'event', 'seq', 'cwnd', 'ssthresh', 'inflight', 'rtt')
+DTYPE = [('time', '<f8'), ('event', '|u1'), ('seq', '<i8'), ('cwnd', '<f8'), ('ssthresh', '<f8'),
+         ('inflight', '<i8'), ('rtt', '<f8')]
+TraceRecord = collections.namedtuple('TraceRecord', FIELDS)
+
+MAGIC = b'\x93NUMPY\x01\x00'
+# magic, header length and the header dict, padded with spaces, room for any record count
+HEADER_SIZE = 256
+# records buffered between writes
+CAPACITY = 4096
+
+
+def _header(count):
+    text = repr({'descr': DTYPE, 'fortran_order': False, 'shape': (count,)})
+    room = HEADER_SIZE - len(MAGIC) - 2
+    return MAGIC + struct.pack('<H', room) + text.ljust(room - 1).encode('latin1') + b'\n'
+
+
+class AckTracer:
+    """Writes trace records to path as a .npy file, close it (or use it as a context manager) when done."""
+
+    def __init__(self, path, capacity=CAPACITY):
+        self.file = open(path, 'wb')
+        self.file.write(_header(0))
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.used = 0  # bytes of the buffer holding records
+        self.count = 0
+        self.start = None
+
+    def record(self, now, event, seq, cwnd, ssthresh, inflight, rtt=math.nan):
+        if self.start is None:
+            self.start = now
+        RECORD.pack_into(self.buffer, self.used, now - self.start, event, seq, cwnd, ssthresh, inflight, rtt)
+        self.used += RECORD.size
+        self.count += 1
+        if self.used == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.file.write(memoryview(self.buffer)[:self.used])
+        self.used = 0
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.seek(0)
+        self.file.write(_header(self.count))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_tracer(path):
+    """an AckTracer writing to path, or without a path a context that gives None."""
+    return AckTracer(path) if path else contextlib.nullcontext()
+
+
+def load(path):
+    """the records of a trace file as a list of TraceRecord."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+        (length,) = struct.unpack('<H', f.read(2))
+        header = ast.literal_eval(f.read(length).decode('latin1'))
+        if header['descr'] != DTYPE:
+            raise ValueError(f"{path} has records of {header['descr']}, not {DTYPE}")
+        data = f.read()
+    (count,) = header['shape']
+    if count == 0:
+        count = len(data) // RECORD.size  # never closed, take what got written
+    return [TraceRecord(*fields) for fields in RECORD.iter_unpack(data[:count * RECORD.size])]
@@ -0,0 +1,215 @@
+"""Batched datagram I/O: many datagrams per system call.
+
+On Linux sendmmsg(2) and recvmmsg(2) are called through ctypes, so a whole
+window goes out, or every ack waiting in the socket comes in, with one
+call. Elsewhere, or for sockets that aren't IPv4, the same methods fall
+back to a loop of sendto/recvfrom. Either way the counters say how many
+datagrams moved and how many system calls that took.
+
+Outgoing datagrams are copied once into a preallocated arena when they are
+queued, since ctypes can't take the address of a read-only buffer (bytes,
+a read-only mmap). That memcpy is much cheaper than the system call it
+saves. The socket must be non-blocking: recv returns what is waiting and
+never blocks, wait for it with select first.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+import sys
+
+# datagrams moved by one sendmmsg/recvmmsg call
+BATCH_SIZE = 64
+# largest datagram a slot holds
+SLOT_SIZE = 2048
+# recvmmsg flag, from <sys/socket.h>
+MSG_DONTWAIT = 0x40
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(iovec)), ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr), ('msg_len', ctypes.c_uint)]
+
+
+# sockaddr_in: family in host order, then port and address in network order
+SOCKADDR_IN = struct.Struct('=H')
+SOCKADDR_IN_SIZE = 16
+
+
+def _load_libc():
+    """libc with sendmmsg and recvmmsg, None where they don't exist."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        for name in ('sendmmsg', 'recvmmsg'):
+            function = getattr(libc, name)
+            function.restype = ctypes.c_int
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+LIBC = _load_libc()
+# whether sendmmsg/recvmmsg can be used at all
+MMSG = LIBC is not None
+
+
+def _check(result):
+    """raise the OSError a socket method would, for a failed libc call."""
+    if result < 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+    return result
+
+
+class DatagramBatch:
+    """Queues outgoing datagrams for one sendmmsg and drains incoming ones with one recvmmsg."""
+
+    def __init__(self, sock, batch=BATCH_SIZE, size=SLOT_SIZE, native=None):
+        self.sock = sock
+        self.batch = batch
+        self.size = size
+        if native is None:
+            native = MMSG and sock.family == socket.AF_INET
+        self.native = native
+        self.queued = []  # fallback: (datagram, address) waiting for flush
+        self.count = 0  # native: datagrams in the send arena
+
+        self.datagrams_sent = 0
+        self.datagrams_received = 0
+        self.send_calls = 0
+        self.recv_calls = 0
+
+        if native:
+            self.addresses = {}  # (host, port) -> packed sockaddr_in
+            self.send_arena, self.send_names, self.send_iovecs, self.send_msgs = self._arena()
+            self.recv_arena, self.recv_names, self.recv_iovecs, self.recv_msgs = self._arena()
+            for msg in self.recv_msgs:
+                msg.msg_hdr.msg_iov.contents.iov_len = size
+                msg.msg_hdr.msg_namelen = SOCKADDR_IN_SIZE
+            self.send_view = memoryview(self.send_arena).cast('B')
+            self.recv_view = memoryview(self.recv_arena).cast('B')
+
+    def _arena(self):
+        """one buffer of batch slots, their sockaddrs, iovecs and the mmsghdr array pointing at them all."""
+        data = ctypes.create_string_buffer(self.batch * self.size)
+        names = ctypes.create_string_buffer(self.batch * SOCKADDR_IN_SIZE)
+        iovecs = (iovec * self.batch)()
+        msgs = (mmsghdr * self.batch)()
+        base, name_base = ctypes.addressof(data), ctypes.addressof(names)
+        for i in range(self.batch):
+            iovecs[i].iov_base = base + i * self.size
+            header = msgs[i].msg_hdr
+            header.msg_name = name_base + i * SOCKADDR_IN_SIZE
+            header.msg_iov = ctypes.pointer(iovecs[i])
+            header.msg_iovlen = 1
+        return data, names, iovecs, msgs
+
+    def _sockaddr(self, address):
+        packed = self.addresses.get(address)
+        if packed is None:
+            host, port = address
+            packed = (SOCKADDR_IN.pack(socket.AF_INET) + port.to_bytes(2, 'big')
+                      + socket.inet_aton(socket.gethostbyname(host)) + bytes(8))
+            self.addresses[address] = packed
+        return packed
+
+    def queue(self, address, *parts):
+        """add one datagram made of parts (bytes-like), sent at the next flush or when the batch is full."""
+        if not self.native:
+            self.queued.append((b''.join(parts), address))
+            if len(self.queued) >= self.batch:
+                self.flush()
+            return
+
+        i = self.count
+        offset = i * self.size
+        for part in parts:
+            end = offset + len(part)
+            if end > (i + 1) * self.size:
+                raise ValueError(f"datagram longer than {self.size} bytes")
+            self.send_view[offset:end] = part
+            offset = end
+        name_offset = i * SOCKADDR_IN_SIZE
+        self.send_names[name_offset:name_offset + SOCKADDR_IN_SIZE] = self._sockaddr(address)
+        header = self.send_msgs[i].msg_hdr
+        header.msg_namelen = SOCKADDR_IN_SIZE
+        header.msg_iov.contents.iov_len = offset - i * self.size
+        self.count += 1
+        if self.count >= self.batch:
+            self.flush()
+
+    def flush(self):
+        """send everything queued."""
+        if not self.native:
+            for datagram, address in self.queued:
+                self.sock.sendto(datagram, address)
+            self.datagrams_sent += len(self.queued)
+            self.send_calls += len(self.queued)
+            self.queued.clear()
+            return
+
+        sent = 0
+        fd = self.sock.fileno()
+        try:
+            while sent < self.count:
+                first = ctypes.cast(ctypes.addressof(self.send_msgs[sent]), ctypes.POINTER(mmsghdr))
+                self.send_calls += 1
+                sent += _check(LIBC.sendmmsg(fd, first, self.count - sent, 0))
+        finally:
+            # on an error whatever wasn't sent is dropped, like a datagram lost on the way
+            self.datagrams_sent += sent
+            self.count = 0
+
+    def recv(self):
+        """every datagram waiting, up to one batch, as (data, address) pairs; [] if none."""
+        if not self.native:
+            received = []
+            while len(received) < self.batch:
+                self.recv_calls += 1
+                try:
+                    received.append(self.sock.recvfrom(self.size))
+                except BlockingIOError:
+                    break
+            self.datagrams_received += len(received)
+            return received
+
+        self.recv_calls += 1
+        count = LIBC.recvmmsg(self.sock.fileno(), self.recv_msgs, self.batch, MSG_DONTWAIT, None)
+        if count < 0 and ctypes.get_errno() in (errno.EAGAIN, errno.EWOULDBLOCK):  # nothing waiting
+            return []
+        _check(count)
+        received = []
+        view, names = self.recv_view, self.recv_names.raw
+        for i in range(count):
+            offset = i * self.size
+            name = names[i * SOCKADDR_IN_SIZE: (i + 1) * SOCKADDR_IN_SIZE]
+            address = (socket.inet_ntoa(name[4:8]), int.from_bytes(name[2:4], 'big'))
+            received.append((bytes(view[offset: offset + self.recv_msgs[i].msg_len]), address))
+            self.recv_msgs[i].msg_hdr.msg_namelen = SOCKADDR_IN_SIZE  # the kernel overwrote it
+        self.datagrams_received += count
+        return received
+
+    def syscalls_saved(self):
+        return self.datagrams_sent + self.datagrams_received - self.send_calls - self.recv_calls
+
+    def summary(self):
+        kind = "sendmmsg/recvmmsg" if self.native else "sendto/recvfrom fallback"
+        return (f"Batched I/O ({kind}): {self.datagrams_sent} datagrams sent in {self.send_calls} calls, "
+                f"{self.datagrams_received} received in {self.recv_calls} calls, "
+                f"{self.syscalls_saved()} system calls saved")
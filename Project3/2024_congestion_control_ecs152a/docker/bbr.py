@@ -0,0 +1,282 @@
+"""BBR: model-based congestion control (after draft-cardwell-iccrg-bbr-congestion-control, v1).
+
+Instead of reacting to loss, BBR keeps a model of the path: the bottleneck
+bandwidth (windowed max of the delivery rate) and the round-trip
+propagation delay (windowed min of the rtt). It paces at a gain times the
+bandwidth and caps the data in flight at a gain times their product (the
+bdp), so random loss that has nothing to do with congestion doesn't shrink
+the window.
+"""
+import collections
+import enum
+import math
+import random
+
+from congestion import CongestionControl
+from pacing import Pacer
+
+# startup doubles the sending rate every round
+HIGH_GAIN = 2 / math.log(2)
+# drain empties the queue startup built in about one round
+DRAIN_GAIN = 1 / HIGH_GAIN
+# probe_bw pacing gains, one phase per min rtt: probe up, drain the probe, cruise
+PACING_GAIN_CYCLE = [1.25, 0.75, 1, 1, 1, 1, 1, 1]
+# cwnd allows this many bdps in flight outside startup and drain
+CWND_GAIN = 2
+# rounds the bandwidth max filter remembers
+BTL_BW_FILTER_ROUNDS = 10
+# seconds a min rtt stays valid before probe_rtt re-measures it
+MIN_RTT_WINDOW = 10.0
+# seconds probe_rtt holds the window at its minimum
+PROBE_RTT_DURATION = 0.2
+# smallest window, in segments
+MIN_CWND_SEGMENTS = 4
+# window before the first bandwidth estimate, in segments
+INITIAL_CWND_SEGMENTS = 10
+# startup ends after this many rounds without the bandwidth growing by FULL_BW_GROWTH
+FULL_BW_ROUNDS = 3
+FULL_BW_GROWTH = 1.25
+
+
+class BBRState(enum.Enum):
+    STARTUP = "startup"
+    DRAIN = "drain"
+    PROBE_BW = "probe_bw"
+    PROBE_RTT = "probe_rtt"
+
+
+class WindowedMaxFilter:
+    """Max of the values seen in the last `window` time units (rounds for BBR).
+
+    Monotonic deque: every entry is larger than the ones after it, so the
+    front is always the max and each value is pushed and popped once.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.entries = collections.deque()  # (time, value), values decreasing
+
+    def update(self, value, time):
+        entries = self.entries
+        while entries and entries[-1][1] <= value:
+            entries.pop()
+        entries.append((time, value))
+        while entries[0][0] <= time - self.window:
+            entries.popleft()
+
+    def get(self):
+        return self.entries[0][1] if self.entries else 0
+
+
+class BBR(CongestionControl):
+    """BBR v1 in bytes, fed by delivery rate samples from the sender runtime.
+
+    Loss doesn't touch the model: three dup acks just resend the hole, and
+    an rto drops the window to one segment, from where every ack grows it
+    by the bytes it acked back up to the model's target. The pacing rate is
+    read by BBRPacer.
+    """
+
+    uses_rate_samples = True
+
+    def __init__(self, mss):
+        super().__init__(mss, initial_cwnd=INITIAL_CWND_SEGMENTS * mss)
+        self.state = BBRState.STARTUP
+        self.pacing_gain = HIGH_GAIN
+        self.cwnd_gain = HIGH_GAIN
+        self.min_cwnd = MIN_CWND_SEGMENTS * mss
+
+        self.btl_bw = WindowedMaxFilter(BTL_BW_FILTER_ROUNDS)  # bytes per second
+        self.min_rtt = None  # seconds
+        self.min_rtt_stamp = None
+
+        self.round_count = 0
+        self.next_round_delivered = 0
+        self.round_start = False
+
+        self.full_bw = 0
+        self.full_bw_count = 0
+        self.filled_pipe = False
+
+        self.cycle_index = 0
+        self.cycle_stamp = None
+        self.probe_rtt_done_stamp = None
+        self.probe_rtt_round_done = False
+        self.prior_cwnd = self.cwnd
+
+        self.inflight = 0  # bytes outstanding as of the latest ack
+        self.delivered = 0  # bytes delivered as of the latest rate sample
+        self.sample = None  # (RateSample, now) waiting for its ack
+
+    def bdp(self):
+        """estimated bandwidth-delay product in bytes, None before the model has both."""
+        if self.min_rtt is None or not self.btl_bw.get():
+            return None
+        return self.btl_bw.get() * self.min_rtt
+
+    def pacing_rate(self, srtt=None):
+        """bytes per second to pace at, None while there is nothing to base it on."""
+        if self.btl_bw.get():
+            return self.pacing_gain * self.btl_bw.get()
+        if srtt:
+            return HIGH_GAIN * self.cwnd / srtt
+        return None
+
+    def on_rate_sample(self, sample, now):
+        self.sample = (sample, now)
+
+    def on_ack(self, ack_id, snd_nxt):
+        if ack_id > self.ack_id:
+            self.inflight = max(snd_nxt - ack_id, 0)
+            if self.sample is not None:
+                self._update_model(*self.sample)
+                self.sample = None
+        return super().on_ack(ack_id, snd_nxt)
+
+    def on_loss(self, snd_nxt):
+        """the model ignores loss, only remember not to resend this window's hole twice."""
+        self.recover = snd_nxt
+
+    def set_mss(self, mss):
+        self.min_cwnd = self.min_cwnd * mss // self.mss
+        super().set_mss(mss)
+
+    def on_timeout(self, snd_nxt):
+        """rto: keep the model, restart from one segment."""
+        self.cwnd = self.mss
+        self.dup_acks = 0
+        self.recover = snd_nxt
+
+    def _on_new_ack(self, ack_id, acked):
+        self._grow(acked)
+        return None
+
+    def _on_dup_ack(self, ack_id, snd_nxt):
+        # resend the hole once per window of data, the model decides the rate
+        if self._loss_detected(snd_nxt):
+            self.on_loss(snd_nxt)
+            return ack_id
+        return None
+
+    def _grow(self, acked):
+        bdp = self.bdp()
+        if bdp is None:
+            self.cwnd += acked  # no model yet, grow like slow start
+        else:
+            target = max(self.cwnd_gain * bdp, self.min_cwnd)
+            if self.filled_pipe:
+                self.cwnd = min(self.cwnd + acked, target)
+            elif self.cwnd < target:
+                self.cwnd += acked
+            self.cwnd = max(self.cwnd, self.min_cwnd)
+
+        if self.state is BBRState.PROBE_RTT:
+            self.cwnd = min(self.cwnd, self.min_cwnd)
+        if self.rwnd is not None:
+            self.cwnd = min(self.cwnd, max(self.rwnd, self.mss))
+        self.cwnd = int(self.cwnd)
+
+    def _update_model(self, sample, now):
+        # a round trip ends when a packet sent after the previous round's end is acked
+        self.delivered = sample.delivered
+        self.round_start = sample.prior_delivered >= self.next_round_delivered
+        if self.round_start:
+            self.next_round_delivered = sample.delivered
+            self.round_count += 1
+
+        self.btl_bw.update(sample.delivery_rate, self.round_count)
+
+        min_rtt_expired = self.min_rtt_stamp is not None and now > self.min_rtt_stamp + MIN_RTT_WINDOW
+        if self.min_rtt is None or sample.rtt <= self.min_rtt or min_rtt_expired:
+            self.min_rtt = sample.rtt
+            self.min_rtt_stamp = now
+
+        if self.state is BBRState.STARTUP:
+            self._check_full_pipe()
+            if self.filled_pipe:
+                self._enter(BBRState.DRAIN, now)
+        if self.state is BBRState.DRAIN and self.inflight <= self.bdp():
+            self._enter(BBRState.PROBE_BW, now)
+        if self.state is BBRState.PROBE_BW:
+            self._advance_cycle(now)
+
+        if min_rtt_expired and self.state is not BBRState.PROBE_RTT:
+            self.prior_cwnd = self._saved_cwnd()
+            self._enter(BBRState.PROBE_RTT, now)
+        if self.state is BBRState.PROBE_RTT:
+            self._probe_rtt(now)
+
+    def _check_full_pipe(self):
+        """startup is over once a few rounds in a row fail to grow the bandwidth by 25%."""
+        if not self.round_start:
+            return
+        if self.btl_bw.get() >= self.full_bw * FULL_BW_GROWTH:
+            self.full_bw = self.btl_bw.get()
+            self.full_bw_count = 0
+            return
+        self.full_bw_count += 1
+        if self.full_bw_count >= FULL_BW_ROUNDS:
+            self.filled_pipe = True
+
+    def _advance_cycle(self, now):
+        gain = self.pacing_gain
+        elapsed = now - self.cycle_stamp > self.min_rtt
+        bdp = self.bdp()
+        if gain > 1:
+            done = elapsed and self.inflight >= gain * bdp
+        elif gain < 1:
+            done = elapsed or self.inflight <= bdp
+        else:
+            done = elapsed
+        if done:
+            self.cycle_index = (self.cycle_index + 1) % len(PACING_GAIN_CYCLE)
+            self.cycle_stamp = now
+            self.pacing_gain = PACING_GAIN_CYCLE[self.cycle_index]
+
+    def _probe_rtt(self, now):
+        """hold the window at min_cwnd for PROBE_RTT_DURATION and at least one round."""
+        if self.probe_rtt_done_stamp is None:
+            if self.inflight <= self.min_cwnd:
+                self.probe_rtt_done_stamp = now + PROBE_RTT_DURATION
+                self.probe_rtt_round_done = False
+                self.next_round_delivered = self.delivered
+            return
+        if self.round_start:
+            self.probe_rtt_round_done = True
+        if self.probe_rtt_round_done and now > self.probe_rtt_done_stamp:
+            self.min_rtt_stamp = now
+            self.cwnd = max(self.cwnd, self.prior_cwnd)
+            self._enter(BBRState.PROBE_BW if self.filled_pipe else BBRState.STARTUP, now)
+
+    def _enter(self, state, now):
+        self.state = state
+        if state is BBRState.STARTUP:
+            self.pacing_gain = self.cwnd_gain = HIGH_GAIN
+        elif state is BBRState.DRAIN:
+            self.pacing_gain, self.cwnd_gain = DRAIN_GAIN, HIGH_GAIN
+        elif state is BBRState.PROBE_BW:
+            # start anywhere but the drain phase
+            self.cycle_index = random.choice([i for i in range(len(PACING_GAIN_CYCLE)) if i != 1])
+            self.cycle_stamp = now
+            self.pacing_gain, self.cwnd_gain = PACING_GAIN_CYCLE[self.cycle_index], CWND_GAIN
+        else:
+            self.pacing_gain, self.cwnd_gain = 1, 1
+            self.probe_rtt_done_stamp = None
+
+    def _saved_cwnd(self):
+        if self.state is BBRState.PROBE_RTT:
+            return max(self.prior_cwnd, self.cwnd)
+        return self.cwnd
+
+
+class BBRPacer(Pacer):
+    """Paces at the rate the BBR model asks for instead of gain * cwnd / srtt."""
+
+    def __init__(self, bbr, trace=False):
+        super().__init__(gain=1, trace=trace)
+        self.bbr = bbr
+
+    def update(self, window, srtt, now):
+        rate = self.bbr.pacing_rate(srtt)
+        if rate:
+            self.set_rate(rate, now)
@@ -0,0 +1,76 @@
+"""Benchmark: many senders transferring to one multi-client receiver at once.
+
+Starts receiver.py with --multi --conn-id on a spare port and runs every
+sender as a SenderRuntime in its own thread, each with its own file,
+local port and connection id. Checks that every output file matches what
+was sent and reports per-flow completion times and aggregate goodput.
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from congestion import NewReno
+from runtime import MESSAGE_SIZE, SenderRuntime
+
+
+def send(index, data, port, results):
+    runtime = SenderRuntime(data, NewReno(MESSAGE_SIZE), sack=True, bind=('127.0.0.1', 0),
+                            receiver=('127.0.0.1', port), conn_id=index)
+    runtime.run()
+    results[index] = runtime
+
+
+def main(senders, size, port, idle_timeout):
+    with tempfile.TemporaryDirectory() as out_dir:
+        receiver = subprocess.Popen(
+            [sys.executable, 'receiver.py', '--multi', '--conn-id', '--sack', '3', '--port', str(port),
+             '--idle-timeout', str(idle_timeout), '--output', os.path.join(out_dir, '{conn}.bin')],
+            stdout=subprocess.PIPE, text=True)
+        try:
+            assert receiver.stdout.readline().strip() == "Receiver running"
+
+            files = [os.urandom(size) for _ in range(senders)]
+            results = [None] * senders
+            threads = [threading.Thread(target=send, args=(i, files[i], port, results)) for i in range(senders)]
+            start = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - start
+        finally:
+            # ctrl-c makes the receiver close (and flush) files whose FINACK never arrived
+            receiver.send_signal(signal.SIGINT)
+            receiver.wait()
+
+        bad = 0
+        for i, data in enumerate(files):
+            with open(os.path.join(out_dir, f'{i}.bin'), 'rb') as f:
+                received = f.read()
+            if received != data:
+                bad += 1
+                print(f"sender {i}: got {len(received)} of {len(data)} bytes")
+
+    durations = sorted(r.end_time - r.start_time for r in results)
+    resent = sum(r.resent_bytes for r in results)
+    print(f"{senders} senders x {size} bytes, {bad} corrupted")
+    print(f"Flow time (s): min {durations[0]:.3f}, median {statistics.median(durations):.3f}, max {durations[-1]:.3f}")
+    print(f"Aggregate goodput (bps): {senders * size * 8 / elapsed:.0f}")
+    print(f"Resent bytes: {resent}")
+    return bad
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="multi-client receiver benchmark")
+    parser.add_argument("--senders", type=int, default=64, help="concurrent senders (default %(default)s)")
+    parser.add_argument("--size", type=int, default=200_000, help="bytes per sender (default %(default)s)")
+    parser.add_argument("--port", type=int, default=5011, help="receiver port (default %(default)s)")
+    parser.add_argument("--idle-timeout", type=float, default=10.0, help="receiver idle timeout (default %(default)s)")
+    args = parser.parse_args()
+    sys.exit(1 if main(args.senders, args.size, args.port, args.idle_timeout) else 0)
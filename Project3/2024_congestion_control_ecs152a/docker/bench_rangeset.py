@@ -0,0 +1,76 @@
+"""Microbenchmark: RangeSet.add at its worst, for the receive buffers in use.
+
+The reassembler only holds --buffer bytes above the next expected byte, so
+the set never has more than buffer / (2 * segment) ranges: one segment held,
+one missing, over and over. Each case builds exactly that and makes every
+add land at the front, where the list slice moves the whole tail:
+
+* scatter: every other segment arrives, last one first;
+* fill: the missing segments arrive, first one first, each merging the
+  two ranges around it.
+
+The cost per add is set against a datagram's trip through a local udp
+socket, which the receiver pays for every segment anyway.
+"""
+import argparse
+import socket
+import time
+
+from rangeset import RangeSet
+from reassembly import RECV_BUFFER
+from runtime import MESSAGE_SIZE
+
+
+def scatter(ranges, count, segment):
+    for k in range(count - 1, -1, -1):
+        ranges.add(2 * k * segment, (2 * k + 1) * segment)
+
+
+def fill(ranges, count, segment):
+    for k in range(count - 1):
+        ranges.add((2 * k + 1) * segment, (2 * k + 2) * segment)
+
+
+def datagram_cost(rounds=20000):
+    """seconds for one sendto + recvfrom of a segment on localhost."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        address = sock.getsockname()
+        payload = bytes(MESSAGE_SIZE)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            sock.sendto(payload, address)
+            sock.recvfrom(2048)
+        return (time.perf_counter() - start) / rounds
+
+
+def main(buffers, segment, repeat):
+    baseline = datagram_cost()
+    print(f"udp datagram round trip: {baseline * 1e6:.2f} us")
+    for buffer in buffers:
+        count = buffer // (2 * segment)
+        for name, case in (('scatter', scatter), ('fill', fill)):
+            best = None
+            for _ in range(repeat):
+                ranges = RangeSet()
+                if case is fill:
+                    scatter(ranges, count, segment)
+                start = time.perf_counter()
+                case(ranges, count, segment)
+                took = time.perf_counter() - start
+                best = took if best is None else min(best, took)
+            per_add = best / max(count - (case is fill), 1)
+            print(f"buffer {buffer >> 10:>6} KiB, {count:>6} ranges, {name:>7}: "
+                  f"{per_add * 1e6:6.2f} us per add, {per_add / baseline:5.2f}x a datagram")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RangeSet.add worst case at receive buffer sizes")
+    parser.add_argument("--buffers", type=int, nargs="+", metavar="BYTES",
+                        default=[RECV_BUFFER, 4 * RECV_BUFFER, 16 * RECV_BUFFER, 64 * RECV_BUFFER],
+                        help="receive buffer sizes to try (default 1, 4, 16 and 64 MiB)")
+    parser.add_argument("--segment", type=int, default=MESSAGE_SIZE, metavar="BYTES",
+                        help="segment payload size (default %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, the best is kept (default %(default)s)")
+    args = parser.parse_args()
+    main(args.buffers, args.segment, args.repeat)
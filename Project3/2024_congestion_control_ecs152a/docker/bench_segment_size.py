@@ -0,0 +1,87 @@
+"""Benchmark: goodput with different segment sizes on the same link.
+
+Starts receiver.py with --multi on a spare port and sends the same data
+once per run and segment size, each transfer starting with the segment
+size handshake and its own connection id. Point --link at an emulated link (the simulator, a netem
+box or a proxy) that forwards to the receiver's port to measure the link
+instead of localhost. Every output file is checked against the input.
+
+Bigger segments spend fewer bytes on headers and fewer packets (and
+per-packet costs) on the same data, but each loss takes more data with it.
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from congestion import NewReno
+from runtime import MESSAGE_SIZE, SenderRuntime
+
+
+def transfer(data, size, probe_mtu, conn_id, link):
+    runtime = SenderRuntime(data, NewReno(size), sack=True, bind=('127.0.0.1', 0), receiver=link,
+                            conn_id=conn_id, segment_size=size, handshake=True, probe_mtu=probe_mtu)
+    runtime.run()
+    return runtime
+
+
+def main(sizes, probe_mtu, runs, size, port, link):
+    data = os.urandom(size)
+    cases = [(s, False) for s in sizes] + ([(min(sizes), True)] if probe_mtu else [])
+    results = {case: [] for case in cases}
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        receiver = subprocess.Popen(
+            [sys.executable, 'receiver.py', '--multi', '--conn-id', '--sack', '3', '--port', str(port),
+             '--output', os.path.join(out_dir, '{conn}.bin')],
+            stdout=subprocess.PIPE, text=True)
+        try:
+            assert receiver.stdout.readline().strip() == "Receiver running"
+            # interleave the cases so a link that changes over time treats them alike
+            # connection ids keep transfers apart behind a link that sends them all from one address
+            for run in range(runs):
+                for i, case in enumerate(cases):
+                    results[case].append(transfer(data, case[0], case[1], run * len(cases) + i, link))
+        finally:
+            receiver.send_signal(signal.SIGINT)
+            receiver.wait()
+
+        bad = 0
+        for name in os.listdir(out_dir):
+            with open(os.path.join(out_dir, name), 'rb') as f:
+                bad += f.read() != data
+
+    print(f"{runs} runs x {size} bytes per segment size, {bad} corrupted")
+    print(f"{'segment':>14}{'goodput Mbps':>16}{'stdev':>10}{'header %':>10}{'resent %':>10}{'handshake s':>13}")
+    for (segment, probed), runtimes in results.items():
+        goodputs = [size * 8 / (r.end_time - r.start_time) / 1e6 for r in runtimes]
+        wire = sum(r.total_bytes for r in runtimes)
+        payload = sum(r.new_bytes + r.resent_bytes for r in runtimes)
+        resent = sum(r.resent_bytes for r in runtimes)
+        label = f"{runtimes[-1].segment_size}{' (probed)' if probed else ''}"
+        print(f"{label:>14}{statistics.mean(goodputs):>16.3f}{statistics.pstdev(goodputs):>10.3f}"
+              f"{100 * (wire - payload) / wire:>10.2f}{100 * resent / payload:>10.2f}"
+              f"{statistics.mean(r.handshake_time or 0 for r in runtimes):>13.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="segment size benchmark")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[MESSAGE_SIZE, 1400], metavar="BYTES",
+                        help="segment payload sizes to compare (default %(default)s)")
+    parser.add_argument("--probe-mtu", action="store_true",
+                        help="also run transfers that probe for the path's largest segment")
+    parser.add_argument("--runs", type=int, default=3, help="transfers per segment size (default %(default)s)")
+    parser.add_argument("--size", type=int, default=2_000_000, help="bytes per transfer (default %(default)s)")
+    parser.add_argument("--port", type=int, default=5021, help="port for the receiver (default %(default)s)")
+    parser.add_argument("--link", metavar="HOST:PORT",
+                        help="send through an emulated link that forwards to the receiver (default: straight to it)")
+    args = parser.parse_args()
+    if args.link:
+        host, _, link_port = args.link.rpartition(':')
+        link = (host, int(link_port))
+    else:
+        link = ('127.0.0.1', args.port)
+    main(args.sizes, args.probe_mtu, args.runs, args.size, args.port, link)
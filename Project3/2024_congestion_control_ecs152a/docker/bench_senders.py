@@ -0,0 +1,267 @@
+"""Benchmark: every sender over a matrix of file sizes and emulated link profiles.
+
+Each run starts receiver.py behind emulator.py (in place of the Docker
+simulator, the senders still send to port 5001) and then one sender
+script as a subprocess, reads the throughput, delay, jitter and metric it
+prints and checks the received file against what was sent. A cell of the
+matrix (sender, size, profile) is repeated --runs times with emulator
+seeds 0, 1, ..., so every sender meets the same links, and each file
+size is the same seeded random data every time.
+
+Results go to --json (every run plus the per-cell summary) and --csv
+(the summary), with means and 95% confidence intervals. Pass an earlier
+--json file as --baseline to flag cells that got worse by more than
+--tolerance and more than the noise; the exit status is then 1, for CI.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# sender name -> the script and its arguments
+SENDERS = {
+    'stop_and_wait': ['sender_stop_and_wait.py'],
+    'fixed': ['sender_fixed_sliding_window.py'],
+    'tahoe': ['sender_tahoe.py'],
+    'reno': ['sender_reno.py'],
+    'bbr': ['sender_bbr.py'],
+    'cubic': ['sender.py', '--cc', 'cubic'],
+    'vegas': ['sender.py', '--cc', 'vegas'],
+}
+DEFAULT_SENDERS = ['stop_and_wait', 'fixed', 'tahoe', 'reno']
+
+# profile name -> emulator.py arguments
+PROFILES = {
+    # training_profile.sh as the container applies it, to the acks
+    'training': [],
+    # the same schedule on the data too
+    'training-both': ['--direction', 'both'],
+    'clean': ['--fixed', '--direction', 'both', '--bandwidth', '100000000', '--delay', '0.005',
+              '--reorder', '0', '0'],
+    'lossy': ['--fixed', '--direction', 'both', '--bandwidth', '10000000', '--loss', '2', '--delay', '0.02'],
+}
+DEFAULT_PROFILES = ['clean', 'lossy']
+
+# what the senders print, in either the runtime senders' or stop and wait's words
+PATTERNS = {
+    'throughput': re.compile(r'^Throughput[^:]*:\s*([-+\d.eE]+)', re.M),
+    'delay': re.compile(r'^Av(?:g|erage) Packet Delay[^:]*:\s*([-+\d.eE]+)', re.M),
+    'jitter': re.compile(r'^Av(?:g|erage) Jitter[^:]*:\s*([-+\d.eE]+)', re.M),
+    'metric': re.compile(r'^(?:Performance )?Metric[^:]*:\s*([-+\d.eE]+)', re.M),
+}
+# whether more is better, for the regression check
+HIGHER_IS_BETTER = {'throughput': True, 'delay': False, 'jitter': False, 'metric': True}
+
+RECEIVER_PORT = 5003
+# 97.5% quantiles of student's t for 1 to 30 degrees of freedom, the normal one past that
+T_975 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+         2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def confidence(values):
+    """(mean, half width of the 95% confidence interval), the width is 0 for a single value."""
+    mean = statistics.mean(values)
+    if len(values) < 2:
+        return mean, 0.0
+    t = T_975[len(values) - 2] if len(values) - 1 <= len(T_975) else 1.96
+    return mean, t * statistics.stdev(values) / math.sqrt(len(values))
+
+
+def make_file(directory, size):
+    """the same random bytes for a size in every run and on every machine."""
+    path = os.path.join(directory, f'{size}.bin')
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(random.Random(size).randbytes(size))
+    return path
+
+
+def stop(process, wait=5):
+    """ctrl-c a helper and give it a moment, receiver.py flushes and emulator.py prints its counters."""
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+    try:
+        return process.communicate(timeout=wait)[0]
+    except subprocess.TimeoutExpired:
+        process.kill()
+        return process.communicate()[0]
+
+
+def startup_problem(process, banner):
+    """None once a helper printed its banner, otherwise the last line it printed instead (a traceback's error)."""
+    line = process.stdout.readline()
+    if line.strip() == banner:
+        return None
+    try:
+        rest = process.communicate(timeout=2)[0]  # most likely it is dying with a traceback
+    except subprocess.TimeoutExpired:
+        rest = stop(process)
+    lines = [l.strip() for l in (line + (rest or '')).splitlines() if l.strip()]
+    return lines[-1] if lines else f"no output, exit status {process.poll()}"
+
+
+def run_once(sender, path, profile, seed, out_dir, port, timeout):
+    """one transfer, returns its record."""
+    output = os.path.join(out_dir, 'received.bin')
+    receiver = subprocess.Popen([sys.executable, 'receiver.py', '--port', str(port), '--output', output],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    emulator = subprocess.Popen([sys.executable, 'emulator.py', '--receiver', f'127.0.0.1:{port}',
+                                 '--seed', str(seed), *PROFILES[profile]],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    record = {'sender': sender, 'size': os.path.getsize(path), 'profile': profile, 'seed': seed, 'ok': False}
+    try:
+        for name, process, banner in (('receiver.py', receiver, "Receiver running"),
+                                      ('emulator.py', emulator, "Emulator running")):
+            problem = startup_problem(process, banner)
+            if problem is not None:
+                record['error'] = f"{name} didn't start: {problem}"
+                return record
+        start = time.monotonic()
+        try:
+            result = subprocess.run([sys.executable, *SENDERS[sender], '--file', path],
+                                    capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            record['error'] = f"timed out after {timeout} s"
+            return record
+        record['wall_time'] = time.monotonic() - start
+        for name, pattern in PATTERNS.items():
+            found = pattern.findall(result.stdout)
+            record[name] = float(found[-1]) if found else None
+        if result.returncode != 0:
+            record['error'] = (result.stderr.strip().splitlines() or [f"exit status {result.returncode}"])[-1]
+            return record
+    finally:
+        # a receiver that saw the finack has exited already
+        try:
+            receiver.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            pass
+        stop(receiver)
+        stop(emulator)
+
+    if not os.path.exists(output):
+        record['error'] = "receiver wrote no file"
+        return record
+    with open(path, 'rb') as sent, open(output, 'rb') as received:
+        record['intact'] = sent.read() == received.read()
+    record['ok'] = record['intact'] and all(record[name] is not None for name in PATTERNS)
+    if not record['intact']:
+        record['error'] = "received file differs"
+    return record
+
+
+def summarize(records):
+    """one row per (sender, size, profile) with the mean and ci of every metric over the runs that worked."""
+    cells = {}
+    for record in records:
+        cells.setdefault((record['sender'], record['size'], record['profile']), []).append(record)
+    rows = []
+    for (sender, size, profile), runs in cells.items():
+        good = [r for r in runs if r['ok']]
+        row = {'sender': sender, 'size': size, 'profile': profile, 'runs': len(runs), 'failed': len(runs) - len(good)}
+        for name in PATTERNS:
+            mean, ci = confidence([r[name] for r in good]) if good else (None, None)
+            row[f'{name}_mean'] = mean
+            row[f'{name}_ci95'] = ci
+        rows.append(row)
+    return rows
+
+
+def regressions(rows, baseline, tolerance):
+    """messages for every metric of a cell that is worse than the baseline's by more than tolerance and the noise."""
+    old = {(row['sender'], row['size'], row['profile']): row for row in baseline}
+    found = []
+    for row in rows:
+        before = old.get((row['sender'], row['size'], row['profile']))
+        if before is None:
+            continue
+        cell = f"{row['sender']} {row['size']} B {row['profile']}"
+        if row['failed'] / row['runs'] > before['failed'] / before['runs']:
+            found.append(f"{cell}: {row['failed']} of {row['runs']} runs failed, baseline {before['failed']} of {before['runs']}")
+        for name, higher in HIGHER_IS_BETTER.items():
+            now, then = row[f'{name}_mean'], before[f'{name}_mean']
+            if now is None or then is None:
+                continue
+            worse = then - now if higher else now - then
+            noise = math.hypot(row[f'{name}_ci95'], before[f'{name}_ci95'])
+            if worse > tolerance * abs(then) and worse > noise:
+                found.append(f"{cell}: {name} {now:.6g} vs baseline {then:.6g} (+/- {noise:.3g})")
+    return found
+
+
+def main(senders, sizes, profiles, runs, timeout, port, json_path, csv_path, baseline_path, tolerance):
+    records = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        files = {size: make_file(out_dir, size) for size in sizes}
+        # repetitions outermost, so a link that drifts over the session treats every sender alike
+        for seed in range(runs):
+            for profile in profiles:
+                for size in sizes:
+                    for sender in senders:
+                        record = run_once(sender, files[size], profile, seed, out_dir, port, timeout)
+                        records.append(record)
+                        status = "ok" if record['ok'] else record.get('error', 'failed')
+                        print(f"run {seed} {sender} {size} B {profile}: {status}", flush=True)
+
+    rows = summarize(records)
+    if not rows:
+        print("No runs to summarize")
+    print(f"{'sender':>14}{'size':>10}{'profile':>15}{'failed':>8}"
+          + "  ".join(f"{name:>24}" for name in ('throughput', 'delay s', 'jitter s', 'metric')))
+    for row in rows:
+        cells = []
+        for name in PATTERNS:
+            mean, ci = row[f'{name}_mean'], row[f'{name}_ci95']
+            cells.append(f"{'-':>24}" if mean is None else f"{mean:>12.5g} +/- {ci:<7.3g}")
+        print(f"{row['sender']:>14}{row['size']:>10}{row['profile']:>15}{row['failed']:>5}/{row['runs']:<2}"
+              + "  ".join(cells))
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump({'runs': records, 'summary': rows}, f, indent=2)
+    if csv_path and rows:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            found = regressions(rows, json.load(f)['summary'], tolerance)
+        for message in found:
+            print(f"REGRESSION {message}")
+        if found:
+            sys.exit(1)
+        print(f"No regressions against {baseline_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark every sender over emulated link profiles")
+    parser.add_argument("--senders", nargs='+', choices=sorted(SENDERS), default=DEFAULT_SENDERS,
+                        help="senders to run (default %(default)s)")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[100_000], metavar="BYTES",
+                        help="file sizes to send (default %(default)s)")
+    parser.add_argument("--profiles", nargs='+', choices=sorted(PROFILES), default=DEFAULT_PROFILES,
+                        help="emulated links, see PROFILES (default %(default)s)")
+    parser.add_argument("--runs", type=int, default=3, help="seeded repetitions of every cell (default %(default)s)")
+    parser.add_argument("--timeout", type=float, default=120, metavar="SECONDS",
+                        help="longest a single transfer may take (default %(default)s)")
+    parser.add_argument("--port", type=int, default=RECEIVER_PORT,
+                        help="port for the receiver behind the emulator (default %(default)s)")
+    parser.add_argument("--json", metavar="FILE", help="write every run and the summary as json")
+    parser.add_argument("--csv", metavar="FILE", help="write the summary as csv")
+    parser.add_argument("--baseline", metavar="FILE", help="an earlier --json to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.1, metavar="FRACTION",
+                        help="how much worse than the baseline a mean may get (default %(default)s)")
+    args = parser.parse_args()
+    main(args.senders, args.sizes, args.profiles, args.runs, args.timeout, args.port,
+         args.json, args.csv, args.baseline, args.tolerance)
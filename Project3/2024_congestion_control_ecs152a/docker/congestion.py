@@ -0,0 +1,346 @@
+"""Congestion control engines for the windowed senders.
+
+cwnd and ssthresh are kept in bytes. The engines only do bookkeeping: the
+sender feeds them acks, rtt samples and timeouts and they answer with the
+seq id that has to be retransmitted, if any, so every transition can be
+driven by hand.
+
+Every engine implements the CongestionControl interface: on_ack, on_loss,
+on_timeout, the cwnd attribute and window(), plus the optional
+on_rtt_sample and on_rate_sample hooks.
+"""
+import enum
+
+# initial slow start threshold, effectively "until the first loss"
+INITIAL_SSTHRESH = 1 << 30
+# duplicate acks that signal a loss
+DUP_ACK_THRESHOLD = 3
+# appropriate byte counting limit L (RFC 3465), in segments per ack during slow start
+ABC_LIMIT = 2
+
+# cubic (RFC 9438): window scaling constant in segments/s^3 and multiplicative decrease factor
+CUBIC_C = 0.4
+CUBIC_BETA = 0.7
+# additive increase of the reno-friendly estimate, in segments per rtt
+CUBIC_ALPHA = 3 * (1 - CUBIC_BETA) / (1 + CUBIC_BETA)
+
+# vegas: segments queued at the bottleneck below which cwnd grows / above which it shrinks
+VEGAS_ALPHA = 2
+VEGAS_BETA = 4
+# slow start ends once more than this many segments are queued
+VEGAS_GAMMA = 1
+
+
+class CongestionState(enum.Enum):
+    SLOW_START = "slow_start"
+    CONGESTION_AVOIDANCE = "congestion_avoidance"
+    FAST_RECOVERY = "fast_recovery"
+
+
+class CongestionControl:
+    """Per-ack window growth shared by the loss-based engines.
+
+    cwnd grows on every new ack by the number of bytes that ack covered
+    (appropriate byte counting, RFC 3465): up to ABC_LIMIT segments per ack
+    in slow start, one segment per cwnd of acked bytes in congestion
+    avoidance. It never grows past the receiver's advertised window.
+    """
+
+    # go-back-n senders resend everything from the lost segment on a fast retransmit
+    fast_retransmit_rewinds = False
+    # model-based engines want delivery rate samples (see delivery.py) before every ack
+    uses_rate_samples = False
+
+    def __init__(self, mss, initial_cwnd=None, ssthresh=INITIAL_SSTHRESH, rwnd=None):
+        self.mss = mss
+        self.cwnd = initial_cwnd if initial_cwnd is not None else mss
+        self.ssthresh = ssthresh
+        self.rwnd = rwnd  # receiver advertised window in bytes, None if it doesn't advertise one
+        self.state = CongestionState.SLOW_START
+        self.ack_id = 0  # highest cumulative ack seen
+        self.dup_acks = 0
+        self.recover = 0  # snd_nxt when the last loss was detected
+        self.bytes_acked = 0  # congestion avoidance byte counter
+
+    def window(self):
+        """bytes the sender may have in flight."""
+        if self.rwnd is None:
+            return self.cwnd
+        # a full receive buffer still takes the segment that fills its hole
+        return min(self.cwnd, max(self.rwnd, self.mss))
+
+    def advertise(self, rwnd):
+        """record the latest window advertised by the receiver."""
+        self.rwnd = rwnd
+
+    def on_ack(self, ack_id, snd_nxt):
+        """process one cumulative ack, snd_nxt is the next byte that would be sent.
+
+        returns the seq id to retransmit right away, or None.
+        """
+        if ack_id > self.ack_id:
+            acked = ack_id - self.ack_id
+            self.ack_id = ack_id
+            self.dup_acks = 0
+            return self._on_new_ack(ack_id, acked)
+        if ack_id == self.ack_id and ack_id < snd_nxt:
+            self.dup_acks += 1
+            return self._on_dup_ack(ack_id, snd_nxt)
+        return None  # stale ack, or nothing outstanding
+
+    def on_loss(self, snd_nxt):
+        """a loss was detected without a timeout: multiplicative decrease."""
+        self.ssthresh = self._halved()
+        self.cwnd = self.ssthresh
+        self.bytes_acked = 0
+        self.recover = snd_nxt
+        self.state = CongestionState.CONGESTION_AVOIDANCE
+
+    def on_timeout(self, snd_nxt):
+        """rto expired: collapse to one segment and slow start again."""
+        self.ssthresh = self._halved()
+        self.cwnd = self.mss
+        self.dup_acks = 0
+        self.bytes_acked = 0
+        self.recover = snd_nxt
+        self.state = CongestionState.SLOW_START
+
+    def on_rtt_sample(self, rtt, now):
+        """rtt of a segment that wasn't retransmitted, measured at now."""
+
+    def set_mss(self, mss):
+        """the segment size changed (a handshake settled on another one), keep the window and ssthresh in segments."""
+        self.cwnd = self.cwnd * mss // self.mss
+        self.ssthresh = self.ssthresh * mss // self.mss
+        self.mss = mss
+
+    def on_rate_sample(self, sample, now):
+        """delivery rate sample for the ack about to be passed to on_ack."""
+
+    def _on_new_ack(self, ack_id, acked):
+        self._grow(acked)
+        return None
+
+    def _on_dup_ack(self, ack_id, snd_nxt):
+        return None
+
+    def _grow(self, acked):
+        if self.state is CongestionState.SLOW_START:
+            self.cwnd += min(acked, ABC_LIMIT * self.mss)
+            if self.cwnd >= self.ssthresh:
+                self.state = CongestionState.CONGESTION_AVOIDANCE
+        else:
+            self.bytes_acked += acked
+            if self.bytes_acked >= self.cwnd:
+                self.bytes_acked -= self.cwnd
+                self.cwnd += self.mss
+
+        # growing past what the receiver accepts buys nothing
+        if self.rwnd is not None:
+            self.cwnd = min(self.cwnd, max(self.rwnd, self.mss))
+
+    def _halved(self):
+        return max(self.cwnd // 2, 2 * self.mss)
+
+    def _loss_detected(self, snd_nxt):
+        """dup ack threshold reached for data sent after the last recovery started."""
+        return self.dup_acks == DUP_ACK_THRESHOLD and self.ack_id >= self.recover
+
+
+class FixedWindow(CongestionControl):
+    """Constant window and no reaction to loss, for the fixed window and stop-and-wait senders."""
+
+    def __init__(self, mss, segments):
+        super().__init__(mss, initial_cwnd=segments * mss)
+
+    def on_loss(self, snd_nxt):
+        pass
+
+    def on_timeout(self, snd_nxt):
+        self.dup_acks = 0
+
+    def _grow(self, acked):
+        pass
+
+
+class Tahoe(CongestionControl):
+    """TCP Tahoe: three dup acks are handled like a timeout, without the wait."""
+
+    fast_retransmit_rewinds = True
+
+    def on_loss(self, snd_nxt):
+        self.on_timeout(snd_nxt)
+
+    def _on_dup_ack(self, ack_id, snd_nxt):
+        if self._loss_detected(snd_nxt):
+            self.on_loss(snd_nxt)
+            return ack_id
+        return None
+
+
+class NewReno(CongestionControl):
+    """TCP Reno with the NewReno partial ack fix (RFC 5681, RFC 6582)."""
+
+    def on_loss(self, snd_nxt):
+        """fast retransmit: cut ssthresh and inflate by the segments the dup acks say left."""
+        self.ssthresh = self._halved()
+        self.cwnd = self.ssthresh + DUP_ACK_THRESHOLD * self.mss
+        self.recover = snd_nxt
+        self.state = CongestionState.FAST_RECOVERY
+
+    def _on_new_ack(self, ack_id, acked):
+        if self.state is CongestionState.FAST_RECOVERY:
+            if ack_id >= self.recover:
+                # full ack: deflate the window and leave recovery
+                self.cwnd = self.ssthresh
+                self.bytes_acked = 0
+                self.state = CongestionState.CONGESTION_AVOIDANCE
+                return None
+            # partial ack: the next hole is lost too, resend it and stay in recovery
+            self.cwnd = max(self.cwnd - acked + self.mss, self.mss)
+            return ack_id
+
+        self._grow(acked)
+        return None
+
+    def _on_dup_ack(self, ack_id, snd_nxt):
+        if self.state is CongestionState.FAST_RECOVERY:
+            # every dup ack means a segment left the network, inflate
+            self.cwnd += self.mss
+            return None
+
+        # only one recovery per window of data (RFC 6582 section 3.2 step 2)
+        if self._loss_detected(snd_nxt):
+            self.on_loss(snd_nxt)
+            return ack_id
+        return None
+
+
+class Cubic(NewReno):
+    """CUBIC (RFC 9438) on top of NewReno loss recovery.
+
+    In congestion avoidance the window follows
+    W(t) = C * (t - K)^3 + W_max, a cubic through the window at the last
+    loss, so it climbs back quickly, plateaus around W_max and then probes
+    beyond it. Where plain Reno would be faster (short rtts, small windows)
+    it follows the Reno-friendly estimate instead. Times come from the rtt
+    samples, so the curve only advances while acks are being timed.
+    """
+
+    def __init__(self, mss, initial_cwnd=None, ssthresh=INITIAL_SSTHRESH, rwnd=None):
+        super().__init__(mss, initial_cwnd, ssthresh, rwnd)
+        self.w_max = 0  # segments, window at the last loss
+        self.epoch_start = None  # start of the current avoidance epoch
+        self.k = 0  # seconds from epoch_start until W(t) reaches w_max again
+        self.w = 0  # cwnd in segments, fractional growth included
+        self.w_est = 0  # reno-friendly estimate in segments
+        self.min_rtt = None
+        self.now = None  # time of the latest rtt sample
+
+    def on_rtt_sample(self, rtt, now):
+        self.now = now
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+
+    def on_loss(self, snd_nxt):
+        self._reset_epoch()
+        super().on_loss(snd_nxt)
+
+    def on_timeout(self, snd_nxt):
+        self._reset_epoch()
+        super().on_timeout(snd_nxt)
+
+    def _halved(self):
+        return max(int(self.cwnd * CUBIC_BETA), 2 * self.mss)
+
+    def _reset_epoch(self):
+        w = self.cwnd / self.mss
+        # fast convergence: a flow whose window keeps shrinking releases bandwidth sooner
+        self.w_max = w * (1 + CUBIC_BETA) / 2 if w < self.w_max else w
+        self.epoch_start = None
+
+    def _grow(self, acked):
+        if self.state is CongestionState.SLOW_START or self.now is None:
+            super()._grow(acked)
+            return
+
+        if self.epoch_start is None:
+            self.epoch_start = self.now
+            self.w = self.w_est = self.cwnd / self.mss
+            self.k = max((self.w_max - self.w) / CUBIC_C, 0) ** (1 / 3)
+
+        t = self.now - self.epoch_start
+        rtt = self.min_rtt or 0
+        # aim for where the curve will be one rtt from now, at most 1.5x the window
+        target = min(max(self._w_cubic(t + rtt), self.w), 1.5 * self.w)
+        segments = acked / self.mss
+        self.w_est += CUBIC_ALPHA * segments / self.w
+
+        if self._w_cubic(t) < self.w_est:
+            self.w = self.w_est  # reno-friendly region
+        else:
+            self.w += (target - self.w) / self.w * segments
+
+        self.cwnd = max(int(self.w * self.mss), self.mss)
+        if self.rwnd is not None:
+            self.cwnd = min(self.cwnd, max(self.rwnd, self.mss))
+
+    def _w_cubic(self, t):
+        return CUBIC_C * (t - self.k) ** 3 + self.w_max
+
+
+class Vegas(NewReno):
+    """TCP Vegas: delay-based avoidance, NewReno when a loss does happen.
+
+    Once per rtt it compares the expected rate cwnd / base_rtt with the
+    actual rate cwnd / rtt. The difference times base_rtt estimates the
+    segments this flow has queued at the bottleneck; cwnd grows by one
+    segment below VEGAS_ALPHA and shrinks by one above VEGAS_BETA, so the
+    queue stays short instead of being filled until something drops.
+    """
+
+    def __init__(self, mss, initial_cwnd=None, ssthresh=INITIAL_SSTHRESH, rwnd=None):
+        super().__init__(mss, initial_cwnd, ssthresh, rwnd)
+        self.base_rtt = None  # smallest rtt ever seen, the propagation delay
+        self.round_rtt = None  # smallest rtt in the current round
+        self.round_end = 0  # the round ends once this byte is acked
+        self.snd_nxt = 0
+
+    def on_rtt_sample(self, rtt, now):
+        if self.base_rtt is None or rtt < self.base_rtt:
+            self.base_rtt = rtt
+        if self.round_rtt is None or rtt < self.round_rtt:
+            self.round_rtt = rtt
+
+    def on_ack(self, ack_id, snd_nxt):
+        self.snd_nxt = snd_nxt
+        return super().on_ack(ack_id, snd_nxt)
+
+    def _grow(self, acked):
+        if self.ack_id < self.round_end or self.round_rtt is None:
+            # mid round, only slow start keeps growing
+            if self.state is CongestionState.SLOW_START:
+                super()._grow(acked)
+            return
+
+        rtt, self.round_rtt = self.round_rtt, None
+        self.round_end = self.snd_nxt
+        segments = self.cwnd / self.mss
+        queued = segments - segments * self.base_rtt / rtt
+
+        if self.state is CongestionState.SLOW_START:
+            if queued > VEGAS_GAMMA:
+                # the queue started building, fall back to the window that fits the pipe
+                self.cwnd = min(self.cwnd, int((segments - queued + 1) * self.mss))
+                self.ssthresh = min(self.ssthresh, self.cwnd)
+                self.state = CongestionState.CONGESTION_AVOIDANCE
+            else:
+                super()._grow(acked)
+        elif queued > VEGAS_BETA:
+            self.cwnd -= self.mss
+        elif queued < VEGAS_ALPHA:
+            self.cwnd += self.mss
+
+        self.cwnd = max(self.cwnd, 2 * self.mss)
+        if self.rwnd is not None:
+            self.cwnd = min(self.cwnd, max(self.rwnd, self.mss))
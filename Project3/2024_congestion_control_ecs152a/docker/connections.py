@@ -0,0 +1,118 @@
+"""Per-transfer state for a receiver that serves many senders at once.
+
+Each transfer is keyed by the sender's address and, when senders put one
+in their header, a connection id, so two transfers from the same address
+stay apart. Every connection has its own reassembler, output file, ack
+policy and idle timer.
+
+Once all of a transfer's data is in, the receiver sends its fin and
+waits for the sender's FINACK. The fin goes again after FIN_INTERVAL,
+doubling each time, and after FIN_RETRIES unanswered resends the
+connection is closed without one: everything is written out by then, only
+the goodbye got lost.
+"""
+from ackpolicy import ACK_DELAY, ACK_EVERY, MIN_WAIT, AckPolicy
+from reassembly import RECV_BUFFER, Reassembler
+
+# seconds without a packet before a connection is dropped
+IDLE_TIMEOUT = 30.0
+# seconds between sweeps for idle connections
+SWEEP_INTERVAL = 1.0
+# seconds before an unanswered fin goes again, doubled for every resend
+FIN_INTERVAL = 0.1
+# fins resent without a FINACK before the connection is closed anyway
+FIN_RETRIES = 5
+
+
+class Connection:
+    """One transfer: where its bytes go and when it gets acked."""
+
+    def __init__(self, key, out, now, buffer=RECV_BUFFER, ack_every=ACK_EVERY, ack_delay=ACK_DELAY):
+        self.key = key
+        self.out = out
+        self.reassembler = Reassembler(out, buffer)
+        self.policy = AckPolicy(ack_every, ack_delay)
+        self.latest_seq_id = 0  # newest arrival, reported first in sack blocks
+        self.segment_size = None  # agreed in the sender's handshake, None without one
+        self.header = None  # the sender's header format (see header.py), acks go out in it
+        self.fec = None  # the FecDecoder once the sender's first parity packet arrives
+        self.datagrams = 0  # everything that arrived, reported back for the sender's fec loss estimate
+        self.last_seen = now
+        self.started = now
+        self.fin_deadline = None  # when the fin goes again, None until it's first sent
+        self.fin_resends = 0
+
+    def fin_sent(self, now):
+        """the fin went out, it goes again at fin_deadline unless FINACK arrives first."""
+        self.fin_deadline = now + FIN_INTERVAL * 2 ** self.fin_resends
+
+    def close(self):
+        self.out.close()
+
+
+class ConnectionTable:
+    """Opens connections on their first packet and closes them on FINACK or when idle.
+
+    A finished or dropped connection is remembered for another idle
+    timeout, so a late retransmission doesn't reopen (and truncate) its
+    output file.
+    """
+
+    def __init__(self, open_output, idle_timeout=IDLE_TIMEOUT, **options):
+        self.open_output = open_output  # key -> writable binary file
+        self.idle_timeout = idle_timeout  # None keeps connections forever
+        self.options = options  # buffer, ack_every, ack_delay for every connection
+        self.connections = {}
+        self.finished = {}  # key -> when it finished
+        self.next_sweep = 0
+
+    def __len__(self):
+        return len(self.connections)
+
+    def get(self, key, now):
+        """the connection for key, opened if new, None if it already finished."""
+        connection = self.connections.get(key)
+        if connection is None:
+            if key in self.finished:
+                return None
+            connection = Connection(key, self.open_output(key), now, **self.options)
+            self.connections[key] = connection
+        connection.last_seen = now
+        return connection
+
+    def finish(self, key, now):
+        """FINACK arrived, returns the closed connection or None."""
+        connection = self.connections.pop(key, None)
+        if connection is not None:
+            connection.close()
+            self.finished[key] = now
+        return connection
+
+    def expire(self, now):
+        """drop connections idle for longer than idle_timeout, returns them.
+
+        Cheap to call on every packet, it only looks once per SWEEP_INTERVAL.
+        """
+        if self.idle_timeout is None or now < self.next_sweep:
+            return []
+        self.next_sweep = now + SWEEP_INTERVAL
+        expired = [c for c in self.connections.values() if now - c.last_seen > self.idle_timeout]
+        self.finished = {key: t for key, t in self.finished.items() if now - t <= self.idle_timeout}
+        for connection in expired:
+            del self.connections[connection.key]
+            connection.close()
+            self.finished[connection.key] = now
+        return expired
+
+    def fin_due(self, now):
+        """connections whose fin went unanswered past its deadline."""
+        return [c for c in self.connections.values() if c.fin_deadline is not None and now >= c.fin_deadline]
+
+    def wait_time(self, now):
+        """seconds until the next delayed ack, fin resend or idle timeout, None when there is nothing to wait for."""
+        waits = [c.policy.wait_time(now) for c in self.connections.values()]
+        waits += [max(c.fin_deadline - now, MIN_WAIT) for c in self.connections.values() if c.fin_deadline is not None]
+        waits = [w for w in waits if w is not None]
+        if self.idle_timeout is not None and (self.connections or self.finished):
+            waits.append(max(self.next_sweep - now, MIN_WAIT))
+        return min(waits) if waits else None
@@ -0,0 +1,51 @@
+"""Delivery rate estimation from the ack stream (after draft-cheng-iccrg-delivery-rate-estimation).
+
+Every transmission remembers how much had been delivered when it left. When
+an ack covers it, the bytes delivered since then divided by the time that
+took is one sample of the rate the path is delivering data at.
+"""
+import collections
+
+RateSample = collections.namedtuple('RateSample', ['delivery_rate', 'rtt', 'prior_delivered', 'delivered'])
+
+
+class DeliveryRate:
+    """Turns sends and cumulative acks into RateSamples."""
+
+    def __init__(self):
+        self.delivered = 0  # bytes cumulatively acked so far
+        self.delivered_time = None  # when delivered last grew
+        self.first_sent_time = None  # send time of the newest acked packet
+        self.packets = {}  # seq_id -> (delivered, delivered_time, first_sent_time, sent_time)
+
+    def on_send(self, seq_id, now):
+        """snapshot the delivery state for a packet leaving now."""
+        if not self.packets:
+            # nothing in flight, start a fresh interval instead of spanning the idle time
+            self.first_sent_time = self.delivered_time = now
+        self.packets[seq_id] = (self.delivered, self.delivered_time, self.first_sent_time, now)
+
+    def on_ack(self, seq_id, acked, now):
+        """acked new bytes arrived and seq_id is the newest segment they cover.
+
+        returns a RateSample, or None when seq_id wasn't sent by this estimator.
+        """
+        self.delivered += acked
+        self.delivered_time = now
+        packet = self.packets.pop(seq_id, None)
+        if packet is None:
+            return None
+
+        prior_delivered, prior_time, first_sent_time, sent_time = packet
+        self.first_sent_time = sent_time
+        # the slower of the send and ack rates over the interval, so ack compression can't inflate it
+        interval = max(sent_time - first_sent_time, now - prior_time)
+        if interval <= 0:
+            return None
+        return RateSample((self.delivered - prior_delivered) / interval, now - sent_time,
+                          prior_delivered, self.delivered)
+
+    def forget_below(self, ack_id):
+        """drop the snapshots of segments the cumulative ack passed."""
+        for seq_id in [sid for sid in self.packets if sid < ack_id]:
+            del self.packets[seq_id]
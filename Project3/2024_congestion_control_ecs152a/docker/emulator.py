@@ -0,0 +1,284 @@
+"""Userspace stand-in for the simulator's tc/netem link, so senders run without Docker.
+
+A UDP proxy between the sender and receiver.py that puts the same
+impairments on the path as training_profile.sh: an HTB token bucket
+whose rate is halved or cut to a third every second and reset to 100000
+bit/s once it falls below 2000, with a loss rate that climbs by 2 or 3
+points along with it and goes back to 0 past 20%; under it a netem queue
+of at most 1000 packets that delays each one by 100 ms and, with a
+correlated 7% / 40% chance, sends one straight away instead, ahead of
+the others.
+
+In the container the profile shapes eth0 going out, which is the
+receiver's acks; --direction picks which way (or both ways) the
+emulator shapes, the other way passes untouched.
+
+Every random choice comes from generators seeded with --seed, one for
+the profile's steps and one per direction for the packets, so the same
+seed gives the same rate and loss schedule and the same fate to the
+n-th packet in each direction. Steps happen every second from the first
+packet.
+
+    python3 receiver.py --port 5003 --output out.mp3 &
+    python3 emulator.py --receiver 127.0.0.1:5003
+    python3 sender.py
+"""
+import argparse
+import heapq
+import random
+import select
+import socket
+import time
+
+# what training_profile.sh starts from and resets to
+BANDWIDTH = 100000  # bit/s
+MIN_BANDWIDTH = 2000
+MAX_LOSS = 20  # percent
+DELAY = 0.1
+REORDER = 7  # percent sent without the delay
+REORDER_CORRELATION = 40  # percent
+LIMIT = 1000  # packets in the queue
+STEP = 1.0  # seconds between profile steps
+# htb's default burst: what the rate earns in one 1 ms tick plus an mtu
+BURST_TICK = 0.001
+MTU = 1600
+
+DIRECTIONS = ('acks', 'data', 'both')
+RECV_SIZE = 65535
+
+
+class TrainingProfile:
+    """training_profile.sh's schedule: one step a second, each halving or thirding the rate."""
+
+    def __init__(self, rng, bandwidth=BANDWIDTH, loss=0):
+        self.rng = rng
+        self.bandwidth = bandwidth
+        self.loss = loss
+
+    def step(self):
+        # RANDOM % 10 + 1 below 7, six times in ten
+        if self.rng.randrange(10) + 1 < 7:
+            self.bandwidth //= 2
+            self.loss += 2
+        else:
+            self.bandwidth //= 3
+            self.loss += 3
+        if self.bandwidth < MIN_BANDWIDTH:
+            self.bandwidth = BANDWIDTH
+        if self.loss > MAX_LOSS:
+            self.loss = 0
+
+
+class NetemLink:
+    """One direction: netem's loss, delay, reordering and queue limit, drained by an htb token bucket.
+
+    Packets sit in one queue ordered by when netem lets them go (a reordered
+    packet's time is its arrival, so it jumps ahead); the token bucket then
+    sends them no faster than the rate. Tokens may go negative by one packet,
+    like htb, and the link waits until they are paid back.
+    """
+
+    def __init__(self, rng, bandwidth=BANDWIDTH, loss=0, delay=DELAY, reorder=REORDER,
+                 correlation=REORDER_CORRELATION, limit=LIMIT):
+        self.rng = rng
+        self.delay = delay
+        self.reorder = reorder / 100
+        self.correlation = correlation / 100
+        self.limit = limit
+        self.set_rate(bandwidth, loss)
+        self.queue = []  # heap of (when netem releases it, arrival number, packet, destination)
+        self.arrivals = 0
+        self.last_random = 0.0  # netem's correlated generator remembers its last value
+        self.tokens = self.burst
+        self.refilled = None
+        # counters for the summary
+        self.sent = 0
+        self.lost = 0
+        self.overflows = 0
+        self.reordered = 0
+
+    def set_rate(self, bandwidth, loss):
+        self.rate = bandwidth / 8  # bytes per second
+        self.loss = loss / 100
+        self.burst = self.rate * BURST_TICK + MTU
+
+    def _correlated(self):
+        """netem's get_crandom: a uniform number pulled towards the last one by the correlation."""
+        value = self.rng.random() * (1 - self.correlation) + self.last_random * self.correlation
+        self.last_random = value
+        return value
+
+    def enqueue(self, packet, destination, now):
+        if self.rng.random() < self.loss:
+            self.lost += 1
+            return
+        if len(self.queue) >= self.limit:
+            self.overflows += 1
+            return
+        if self._correlated() < self.reorder:
+            release = now
+            self.reordered += 1
+        else:
+            release = now + self.delay
+        self.arrivals += 1
+        heapq.heappush(self.queue, (release, self.arrivals, packet, destination))
+
+    def _refill(self, now):
+        if self.refilled is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+    def next_time(self, now):
+        """when the next packet can leave, None with nothing queued."""
+        if not self.queue:
+            return None
+        self._refill(now)
+        ready = now if self.tokens >= 0 else now - self.tokens / self.rate
+        return max(self.queue[0][0], ready)
+
+    def dequeue(self, now):
+        """the (packet, destination) pairs due by now."""
+        due = []
+        self._refill(now)
+        while self.queue and self.queue[0][0] <= now and self.tokens >= 0:
+            _, _, packet, destination = heapq.heappop(self.queue)
+            self.tokens -= len(packet)
+            self.sent += 1
+            due.append((packet, destination))
+        return due
+
+    def summary(self):
+        return (f"{self.sent} sent, {self.lost} lost, {self.overflows} over the queue limit, "
+                f"{self.reordered} reordered")
+
+
+class Emulator:
+    """The proxy: takes senders on listen, gives each its own socket towards the receiver.
+
+    A sender's packets leave from its own upstream socket, so the
+    receiver tells senders apart by address as it would without the
+    emulator, and whatever the receiver sends to that socket goes back to
+    the sender.
+    """
+
+    def __init__(self, listen, receiver, seed=None, direction='acks', fixed=False, bandwidth=BANDWIDTH, loss=0,
+                 verbose=False, **netem):
+        self.receiver = receiver
+        self.direction = direction
+        self.fixed = fixed
+        self.verbose = verbose
+        self.profile = TrainingProfile(random.Random(seed), bandwidth, loss)
+        # str seeds hash the same in every run
+        self.links = {
+            name: NetemLink(random.Random(None if seed is None else f"{seed}-{name}"), bandwidth, loss, **netem)
+            if direction in (name, 'both') else None
+            for name in ('data', 'acks')
+        }
+        self.front = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.front.bind(listen)
+        self.upstream = {}  # sender address -> its socket towards the receiver
+        self.senders = {}  # upstream socket -> sender address
+        self.started = None
+        self.steps = 0
+
+    def _forward(self, name, packet, sock, destination, now):
+        link = self.links[name]
+        if link is None:
+            sock.sendto(packet, destination)
+        else:
+            link.enqueue(packet, (sock, destination), now)
+
+    def _step_profile(self, now):
+        """catch up on the profile steps due by now, the first one at the first packet."""
+        if self.fixed or self.started is None:
+            return
+        while self.started + self.steps * STEP <= now:
+            self.profile.step()
+            self.steps += 1
+            for link in self.links.values():
+                if link is not None:
+                    link.set_rate(self.profile.bandwidth, self.profile.loss)
+            if self.verbose:
+                print(f"{self.steps * STEP - STEP:.0f} s: {self.profile.bandwidth} bit/s, {self.profile.loss}% loss")
+
+    def run(self, duration=None):
+        """forward packets until interrupted, or for duration seconds."""
+        stop = time.monotonic() + duration if duration is not None else None
+        try:
+            while stop is None or time.monotonic() < stop:
+                now = time.monotonic()
+                self._step_profile(now)
+                wake = [link.next_time(now) for link in self.links.values() if link is not None]
+                wake = [t for t in wake if t is not None]
+                if self.started is not None and not self.fixed:
+                    wake.append(self.started + self.steps * STEP)
+                if stop is not None:
+                    wake.append(stop)
+                timeout = max(0, min(wake) - now) if wake else None
+
+                readable, _, _ = select.select([self.front, *self.senders], [], [], timeout)
+                now = time.monotonic()
+                for sock in readable:
+                    packet, address = sock.recvfrom(RECV_SIZE)
+                    if self.started is None:
+                        self.started = now
+                        self._step_profile(now)
+                    if sock is self.front:
+                        upstream = self.upstream.get(address)
+                        if upstream is None:
+                            upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                            upstream.bind(('0.0.0.0', 0))
+                            self.upstream[address] = upstream
+                            self.senders[upstream] = address
+                        self._forward('data', packet, upstream, self.receiver, now)
+                    else:
+                        self._forward('acks', packet, self.front, self.senders[sock], now)
+
+                for link in self.links.values():
+                    if link is not None:
+                        for packet, (sock, destination) in link.dequeue(now):
+                            sock.sendto(packet, destination)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for name, link in self.links.items():
+                if link is not None:
+                    print(f"{name}: {link.summary()}")
+            for sock in self.senders:
+                sock.close()
+            self.front.close()
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="training_profile.sh's network emulation as a udp proxy")
+    parser.add_argument("--port", type=int, default=5001, help="port senders send to (default %(default)s)")
+    parser.add_argument("--receiver", type=parse_address, default=('127.0.0.1', 5003), metavar="HOST:PORT",
+                        help="where receiver.py listens (default 127.0.0.1:5003)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for every random choice (default %(default)s)")
+    parser.add_argument("--direction", choices=DIRECTIONS, default='acks',
+                        help="what gets shaped, acks is what the container's profile does (default %(default)s)")
+    parser.add_argument("--fixed", action="store_true",
+                        help="keep --bandwidth and --loss instead of stepping through the profile")
+    parser.add_argument("--bandwidth", type=int, default=BANDWIDTH, metavar="BIT/S",
+                        help="starting rate (default %(default)s)")
+    parser.add_argument("--loss", type=float, default=0, metavar="PERCENT", help="starting loss (default %(default)s)")
+    parser.add_argument("--delay", type=float, default=DELAY, metavar="SECONDS",
+                        help="netem delay (default %(default)s)")
+    parser.add_argument("--reorder", type=float, nargs=2, default=[REORDER, REORDER_CORRELATION],
+                        metavar=("PERCENT", "CORRELATION"),
+                        help="netem reorder, packets sent without the delay (default %(default)s)")
+    parser.add_argument("--limit", type=int, default=LIMIT, metavar="PACKETS",
+                        help="netem queue limit (default %(default)s)")
+    parser.add_argument("--duration", type=float, metavar="SECONDS", help="stop after this long (default: ctrl-c)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every profile step")
+    args = parser.parse_args()
+    emulator = Emulator(('0.0.0.0', args.port), args.receiver, seed=args.seed, direction=args.direction,
+                        fixed=args.fixed, bandwidth=args.bandwidth, loss=args.loss, verbose=args.verbose,
+                        delay=args.delay, reorder=args.reorder[0], correlation=args.reorder[1], limit=args.limit)
+    print("Emulator running")
+    emulator.run(args.duration)
@@ -0,0 +1,323 @@
+"""Forward error correction: parity packets that let the receiver rebuild lost segments.
+
+The sender groups the segments it sends for the first time into blocks of
+n consecutive segments (fewer while the window is smaller) and, after the
+last segment of a block, sends k parity packets computed over it. Any n of
+the block's n + k packets give back all of its data, so up to k losses per
+block are repaired at the receiver without waiting a round trip for a
+retransmission. Until a hole's parity is due the receiver holds back the
+acks that would report it, so the sender doesn't resend it meanwhile.
+
+With k = 1 the parity is the XOR of the block. With more, it is a
+systematic Reed-Solomon code over GF(256) with a Cauchy generator matrix,
+parity j being sum_i 1 / (x_j + y_i) * segment_i. Multiplying a whole
+segment by a constant is one bytes.translate through that constant's
+multiplication table, and adding segments is an XOR of two big ints, so
+neither needs a byte loop in Python (or NumPy).
+
+Segments are coded as symbols of a 2-byte length followed by the payload
+padded to the segment size, so a short last segment comes back at its
+own length. Parity travels in control packets (see handshake.py), a
+receiver that doesn't know about it ignores them.
+
+k adapts to the loss rate: every parity packet carries the number of
+datagrams sent so far, the receiver echoes it with the number it got, and
+the difference between two such reports is the path's loss over that
+stretch, before any repair. k is the smallest number of parity packets
+that leaves less than RESIDUAL_LOSS of blocks with more losses than they
+can repair.
+"""
+import math
+import struct
+
+PARITY_TAG = b'==FEC=='
+REPORT_REPLY = b'fec'
+# block's first byte, segment size, data segments in the block, parity packets, this one's index, datagrams sent
+PARITY = struct.Struct('>QIBBBQ')
+# the echoed datagrams-sent count, datagrams received on the connection
+REPORT = struct.Struct('>QQ')
+# a symbol starts with the length of the segment's payload
+LENGTH = struct.Struct('>H')
+# what a parity packet carries on top of a data segment
+OVERHEAD = len(PARITY_TAG) + PARITY.size + LENGTH.size
+
+# data segments per block
+BLOCK = 8
+# the cauchy matrix needs n + k distinct field elements, data segments use 0..n-1, parity X_BASE + j
+X_BASE = 128
+MAX_BLOCK = X_BASE
+# parity packets per block while adapting
+MIN_PARITY = 1
+MAX_PARITY = 4
+# share of blocks allowed to lose more than their parity repairs
+RESIDUAL_LOSS = 0.02
+# weight of a new loss sample in the running estimate
+LOSS_GAIN = 1 / 8
+
+# GF(256) with the polynomial x^8 + x^4 + x^3 + x^2 + 1
+_EXP = [0] * 510
+_LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    _EXP[_i] = _EXP[_i + 255] = _x
+    _LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11d
+_TABLES = {}  # constant -> its multiplication table, for bytes.translate
+
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def gf_inv(a):
+    return _EXP[255 - _LOG[a]]
+
+
+def coefficient(j, i, parity):
+    """what segment i is multiplied by in parity packet j of a block with parity packets."""
+    return 1 if parity == 1 else gf_inv((X_BASE + j) ^ i)
+
+
+def scale(symbol, c):
+    """symbol times c, byte by byte in GF(256), as an int ready to be XORed."""
+    if c != 1:
+        table = _TABLES.get(c)
+        if table is None:
+            table = _TABLES[c] = bytes(gf_mul(c, x) for x in range(256))
+        symbol = symbol.translate(table)
+    return int.from_bytes(symbol, 'little')
+
+
+def encode_symbol(payload, segment_size):
+    return LENGTH.pack(len(payload)) + bytes(payload) + bytes(segment_size - len(payload))
+
+
+def decode_symbol(symbol):
+    length, = LENGTH.unpack_from(symbol)
+    return symbol[LENGTH.size:LENGTH.size + length]
+
+
+def invert(matrix):
+    """the inverse of a square matrix over GF(256), by gauss-jordan elimination.
+
+    Every square piece of a cauchy matrix is invertible, so there is always a pivot.
+    """
+    m = len(matrix)
+    rows = [list(row) + [int(r == c) for c in range(m)] for r, row in enumerate(matrix)]
+    for col in range(m):
+        pivot = next(r for r in range(col, m) if rows[r][col])
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        inverse = gf_inv(rows[col][col])
+        rows[col] = [gf_mul(inverse, v) for v in rows[col]]
+        for r in range(m):
+            factor = rows[r][col]
+            if r != col and factor:
+                rows[r] = [v ^ gf_mul(factor, p) for v, p in zip(rows[r], rows[col])]
+    return [row[m:] for row in rows]
+
+
+def encode_report(sent, received):
+    return REPORT_REPLY + REPORT.pack(sent, received)
+
+
+def parity_for(loss, block, low=MIN_PARITY, high=MAX_PARITY, residual=RESIDUAL_LOSS):
+    """fewest parity packets for which a block loses more than it can repair less than residual of the time."""
+    for k in range(low, high):
+        total = block + k
+        repaired = sum(math.comb(total, lost) * loss ** lost * (1 - loss) ** (total - lost) for lost in range(k + 1))
+        if 1 - repaired < residual:
+            return k
+    return high
+
+
+class FecEncoder:
+    """The sender's side: builds parity as segments go out and adapts how much from the receiver's reports.
+
+    With parity set every block gets that many parity packets, otherwise
+    between MIN_PARITY and max_parity depending on the measured loss.
+    """
+
+    def __init__(self, block=BLOCK, parity=None, max_parity=MAX_PARITY):
+        if not 0 < block <= MAX_BLOCK:
+            raise ValueError(f"fec blocks hold 1 to {MAX_BLOCK} segments, not {block}")
+        if not 0 < (parity or max_parity) < 256 - X_BASE:
+            raise ValueError(f"fec blocks get 1 to {255 - X_BASE} parity packets, not {parity or max_parity}")
+        self.block = block
+        self.fixed = parity
+        self.max_parity = max_parity
+        self.overhead = OVERHEAD
+        self.loss = 0.0  # the path's loss rate before repair, smoothed
+        self.last_report = None  # (echoed sent, received) of the newest report
+        self.first = None  # first byte of the block being built
+        self.size = block  # segments the block being built gets
+        self.parity = 0  # parity packets the block being built gets
+        self.sums = []  # one running parity per parity packet, as ints
+        self.count = 0  # segments in the block so far
+        # counters for the summary
+        self.blocks = 0
+        self.parity_sent = 0
+
+    def on_segment(self, seq_id, payload, segment_size, sent, window, last=False):
+        """add a segment sent for the first time, returns the parity bodies to send after it (usually none).
+
+        sent is how many datagrams went out so far. A block holds no more
+        segments than the window (in segments) when it starts, so a sender
+        with a small window doesn't have to wait for acks to finish it,
+        and last closes it early at the end of the data.
+        """
+        if self.count == 0:
+            self.first = seq_id
+            self.size = max(1, min(self.block, window))
+            self.parity = self.fixed if self.fixed is not None else parity_for(self.loss, self.size,
+                                                                                high=self.max_parity)
+            self.sums = [0] * self.parity
+        symbol = encode_symbol(payload, segment_size)
+        for j in range(self.parity):
+            self.sums[j] ^= scale(symbol, coefficient(j, self.count, self.parity))
+        self.count += 1
+        if self.count < self.size and not last:
+            return []
+
+        length = segment_size + LENGTH.size
+        bodies = [PARITY_TAG + PARITY.pack(self.first, segment_size, self.count, self.parity, j, sent + j)
+                  + total.to_bytes(length, 'little') for j, total in enumerate(self.sums)]
+        self.blocks += 1
+        self.parity_sent += len(bodies)
+        self.count = 0
+        return bodies
+
+    def on_report(self, body):
+        """fold a receiver report into the loss estimate, False if body isn't one."""
+        if not body.startswith(REPORT_REPLY) or len(body) != len(REPORT_REPLY) + REPORT.size:
+            return False
+        sent, received = REPORT.unpack_from(body, len(REPORT_REPLY))
+        if self.last_report is not None:
+            last_sent, last_received = self.last_report
+            if sent <= last_sent:
+                return True  # reordered, the newer one is in already
+            sample = 1 - min(received - last_received, sent - last_sent) / (sent - last_sent)
+            self.loss += LOSS_GAIN * (sample - self.loss)
+        self.last_report = (sent, received)
+        return True
+
+    def summary(self):
+        return (f"FEC: {self.blocks} blocks of up to {self.block}, {self.parity_sent} parity packets, "
+                f"measured loss {self.loss:.2%}")
+
+
+class FecDecoder:
+    """The receiver's side for one connection: keeps the data of unfinished blocks and rebuilds what's missing.
+
+    It starts with the connection's first parity packet; a segment that
+    arrived before that can't be used.
+    """
+
+    def __init__(self, segment_size):
+        self.segment_size = segment_size
+        self.block = 1  # most segments seen in a block
+        self.data = {}  # seq_id -> symbol, for segments a block's parity may still need
+        self.parity = {}  # block's first byte -> (segments, parity count, {j: parity symbol})
+        self.floor = 0  # data below this is forgotten
+        self.gap = None  # the hole arrivals are being held for
+        self.held = 0  # arrivals held for it so far
+        self.recovered = 0
+
+    @classmethod
+    def from_parity(cls, body):
+        """a decoder for the segment size a connection's first parity packet uses."""
+        return cls(PARITY.unpack_from(body, len(PARITY_TAG))[1])
+
+    def on_data(self, seq_id, payload, expected):
+        """remember a segment, returns the (seq_id, payload) of segments it lets us rebuild."""
+        if len(payload) > self.segment_size:
+            return []  # a resend from before a segment size change
+        self._forget_below(expected)
+        if seq_id < self.floor or seq_id in self.data:
+            return []
+        self.data[seq_id] = encode_symbol(payload, self.segment_size)
+        for first, (segments, _, _) in self.parity.items():
+            if first <= seq_id < first + segments * self.segment_size:
+                return self._recover(first)
+        return []
+
+    def on_parity(self, body, expected):
+        """take a parity packet, returns (datagrams-sent count it carried, rebuilt (seq_id, payload) list)."""
+        first, segment_size, segments, parity, j, sent = PARITY.unpack_from(body, len(PARITY_TAG))
+        symbol = body[len(PARITY_TAG) + PARITY.size:]
+        if segment_size != self.segment_size or len(symbol) != segment_size + LENGTH.size:
+            return sent, []
+        self.block = max(self.block, segments)
+        self._forget_below(expected)
+        if first + segments * segment_size <= expected:
+            return sent, []  # the whole block is in already
+        entry = self.parity.setdefault(first, (segments, parity, {}))
+        entry[2][j] = symbol
+        return sent, self._recover(first)
+
+    def hold(self, expected):
+        """whether to hold back the ack for an arrival above the hole at expected.
+
+        The hole's parity follows the last segment of its block, at most
+        block - 1 arrivals later, and until it comes acking out of order
+        data would only make the sender resend what the parity repairs.
+        Once the parity came and wasn't enough, or should have come, the
+        acks go out as usual.
+        """
+        if expected != self.gap:
+            self.gap, self.held = expected, 0
+        for first, (segments, _, _) in self.parity.items():
+            if first <= expected < first + segments * self.segment_size:
+                return False
+        self.held += 1
+        return self.held < self.block
+
+    def _recover(self, first):
+        segments, parity, symbols = self.parity[first]
+        ids = [first + i * self.segment_size for i in range(segments)]
+        missing = [i for i, seq_id in enumerate(ids) if seq_id not in self.data]
+        if not missing:
+            del self.parity[first]
+            return []
+        if len(missing) > len(symbols):
+            return []  # not yet, maybe never
+
+        rows = sorted(symbols)[:len(missing)]
+        # take the segments we have out of each parity, what's left is a combination of the missing ones
+        remainders = []
+        for j in rows:
+            total = int.from_bytes(symbols[j], 'little')
+            for i, seq_id in enumerate(ids):
+                if i not in missing:
+                    total ^= scale(self.data[seq_id], coefficient(j, i, parity))
+            remainders.append(total)
+        inverse = invert([[coefficient(j, i, parity) for i in missing] for j in rows])
+
+        length = self.segment_size + LENGTH.size
+        rebuilt = []
+        for row, i in zip(inverse, missing):
+            total = 0
+            for c, remainder in zip(row, remainders):
+                if c:
+                    total ^= scale(remainder.to_bytes(length, 'little'), c)
+            symbol = total.to_bytes(length, 'little')
+            self.data[ids[i]] = symbol
+            rebuilt.append((ids[i], decode_symbol(symbol)))
+        self.recovered += len(rebuilt)
+        del self.parity[first]
+        return rebuilt
+
+    def _forget_below(self, expected):
+        """drop what no block the cumulative ack hasn't passed can need, once per block's worth of progress."""
+        # the block the hole at expected is in started at most block - 1 segments before it
+        floor = expected - self.block * self.segment_size
+        if floor < self.floor + self.block * self.segment_size:
+            return
+        self.floor = floor
+        self.data = {seq_id: symbol for seq_id, symbol in self.data.items() if seq_id >= floor}
+        for first in [first for first, (segments, _, _) in self.parity.items()
+                      if first + segments * self.segment_size <= expected]:
+            del self.parity[first]
@@ -0,0 +1,142 @@
+"""Segment size handshake and path MTU probing (in the spirit of RFC 8899).
+
+Before any data a sender may send a hello asking for a segment size. The
+receiver answers with the size it agrees to, at most its own maximum, plus
+that maximum, and remembers the size for the connection. A flow carrying
+one stripe of a file (see parallel_sender.py) also puts in its hello
+where in the file its bytes go.
+
+The sender can then probe for a bigger segment (datagram packetization
+layer PMTUD): a probe is a control packet padded to a whole segment of the
+candidate size, sent with the don't-fragment bit set, and the receiver
+echoes the size of every probe that arrived whole. A size the kernel
+refuses (EMSGSIZE) or whose probe goes unanswered MAX_PROBES times is too
+big. The search starts at the smaller of the receiver's maximum and what
+the interface MTU leaves for payload, and bisects down from there.
+
+Control packets carry sequence id CONTROL_ID, which no data segment uses.
+Sizes are payload bytes, the header is not included.
+"""
+import socket
+import struct
+import sys
+
+# sequence id of hellos, probes and their replies
+CONTROL_ID = -1
+HELLO_TAG = b'==HELLO=='
+PROBE_TAG = b'==PROBE=='
+HELLO_REPLY = b'hello'
+PROBE_REPLY = b'probe'
+# a segment size, or the receiver's maximum
+SIZE = struct.Struct('>I')
+# where a striped flow's byte 0 goes in the merged file
+STRIPE_OFFSET = struct.Struct('>Q')
+
+# largest segment a receiver takes by default, a 9000-byte jumbo frame less ip, udp and a 4-byte header
+MAX_SEGMENT = 9000 - 28 - 4
+# ip and udp headers in front of every datagram
+IP_UDP_OVERHEAD = 28
+# attempts at a probe size before it counts as too big (RFC 8899 MAX_PROBES)
+MAX_PROBES = 3
+# the search stops once the sizes still in question are this close together
+PROBE_RESOLUTION = 8
+
+# linux socket options, from <linux/in.h>
+IP_MTU = getattr(socket, 'IP_MTU', 14)
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_PMTUDISC_PROBE = getattr(socket, 'IP_PMTUDISC_PROBE', 3)
+
+
+def encode_hello(size, stripe_offset=None):
+    hello = HELLO_TAG + SIZE.pack(size)
+    if stripe_offset is not None:
+        hello += STRIPE_OFFSET.pack(stripe_offset)
+    return hello
+
+
+def decode_stripe_offset(message):
+    """the stripe offset in a hello, None for anything else."""
+    if message.startswith(HELLO_TAG) and len(message) == len(HELLO_TAG) + SIZE.size + STRIPE_OFFSET.size:
+        return STRIPE_OFFSET.unpack_from(message, len(HELLO_TAG) + SIZE.size)[0]
+    return None
+
+
+def encode_probe(size):
+    """a probe payload padded to size bytes."""
+    body = PROBE_TAG + SIZE.pack(size)
+    return body + bytes(size - len(body))
+
+
+def answer(message, max_segment):
+    """the receiver's reply body to a control message and the segment size it confirms, (None, None) for anything else.
+
+    A probe that arrived shorter than its size was truncated and gets no reply.
+    """
+    if message.startswith(HELLO_TAG):
+        size = min(SIZE.unpack_from(message, len(HELLO_TAG))[0], max_segment)
+        return HELLO_REPLY + SIZE.pack(size) + SIZE.pack(max_segment), size
+    if message.startswith(PROBE_TAG):
+        size = SIZE.unpack_from(message, len(PROBE_TAG))[0]
+        if size == len(message) <= max_segment:
+            return PROBE_REPLY + SIZE.pack(size), size
+    return None, None
+
+
+def decode_hello_reply(body):
+    """(agreed size, receiver maximum)."""
+    return SIZE.unpack_from(body, len(HELLO_REPLY))[0], SIZE.unpack_from(body, len(HELLO_REPLY) + SIZE.size)[0]
+
+
+def decode_probe_reply(body):
+    return SIZE.unpack_from(body, len(PROBE_REPLY))[0]
+
+
+def set_dont_fragment(sock):
+    """send with DF and ignore the cached path MTU, so a probe too big fails instead of being fragmented."""
+    if sys.platform.startswith('linux'):
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_PROBE)
+        except OSError:
+            pass
+
+
+def interface_mtu(address):
+    """the kernel's MTU towards address, None where it can't be asked."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            return sock.getsockopt(socket.IPPROTO_IP, IP_MTU)
+    except OSError:
+        return None
+
+
+class ProbeSearch:
+    """Finds the largest segment size that gets through whole.
+
+    The first probe tries the ceiling, since it usually works; after a
+    failure the search bisects between the largest confirmed size and the
+    largest size not yet ruled out.
+    """
+
+    def __init__(self, confirmed, ceiling, resolution=PROBE_RESOLUTION):
+        self.confirmed = confirmed  # largest size known to arrive
+        self.high = ceiling  # largest size not yet ruled out
+        self.resolution = resolution
+        self.probes = 0
+
+    def next_size(self):
+        """the next size to probe, None once the search is over."""
+        if self.high <= self.confirmed:
+            return None
+        if self.probes == 0:
+            return self.high
+        if self.high - self.confirmed < self.resolution:
+            return None
+        return (self.confirmed + self.high + 1) // 2
+
+    def on_result(self, size, arrived):
+        self.probes += 1
+        if arrived:
+            self.confirmed = size
+        else:
+            self.high = size - 1
@@ -0,0 +1,105 @@
+"""Packet headers: the stock 4-byte sequence id and a versioned wide one.
+
+The stock header is the byte offset as a signed 4-byte big-endian int,
+optionally followed by a 4-byte connection id, with -1 marking control
+packets (see handshake.py). It can't address past 2 GiB.
+
+The wide header is a version byte, a flags byte and the offset as an
+unsigned 8-byte int, followed by the connection id when FLAG_CONN_ID is
+set. The version byte has its top bit set, which no stock sequence id
+starts with except -1's 0xff, so the receiver tells the two apart from the
+first byte and answers in the same format. Wide acks carry their SACK
+blocks as pairs of 8-byte offsets.
+
+The stock header stays the default; senders switch with --wide.
+"""
+import struct
+
+from handshake import CONTROL_ID
+from sack import SACK_BLOCK
+
+# the stock sequence id, a signed 4-byte big-endian int
+HEADER = struct.Struct('>i')
+# optional connection id after the sequence id, for a receiver serving many senders
+CONN_ID = struct.Struct('>I')
+
+# version, flags, offset
+WIDE = struct.Struct('>BBQ')
+WIDE_VERSION = 0x81
+# a hello, a probe or a reply to one, the offset is unused
+FLAG_CONTROL = 0x01
+# a connection id follows the header
+FLAG_CONN_ID = 0x02
+# a (start, end) sack block in a wide ack
+WIDE_SACK_BLOCK = struct.Struct('>QQ')
+
+
+class StockHeader:
+    """The original 4-byte header, plus the connection id if there is one."""
+
+    sack_block = SACK_BLOCK
+
+    def __init__(self, conn_id=None):
+        self.suffix = CONN_ID.pack(conn_id) if conn_id is not None else b''
+        self.buffer = bytearray(HEADER.size) + self.suffix  # reused for every data packet
+        self.size = len(self.buffer)
+
+    def data(self, seq_id):
+        """the header for a data segment, packed into the reused buffer."""
+        try:
+            HEADER.pack_into(self.buffer, 0, seq_id)
+        except struct.error:
+            raise ValueError(f"offset {seq_id} doesn't fit the 4-byte header, send with --wide") from None
+        return self.buffer
+
+    def pack(self, seq_id, control=False):
+        return HEADER.pack(CONTROL_ID if control else seq_id) + self.suffix
+
+    def parse(self, packet, conn_id=False):
+        """(seq_id, control, connection id or 0, where the body starts)."""
+        seq_id, = HEADER.unpack_from(packet)
+        offset, conn = HEADER.size, 0
+        if conn_id:
+            conn, = CONN_ID.unpack_from(packet, offset)
+            offset += CONN_ID.size
+        return seq_id, seq_id == CONTROL_ID, conn, offset
+
+
+class WideHeader:
+    """The versioned header with a 64-bit offset and a flags byte."""
+
+    sack_block = WIDE_SACK_BLOCK
+
+    def __init__(self, conn_id=None):
+        self.flags = FLAG_CONN_ID if conn_id is not None else 0
+        self.suffix = CONN_ID.pack(conn_id) if conn_id is not None else b''
+        self.buffer = bytearray(WIDE.size) + self.suffix
+        self.size = len(self.buffer)
+
+    def data(self, seq_id):
+        WIDE.pack_into(self.buffer, 0, WIDE_VERSION, self.flags, seq_id)
+        return self.buffer
+
+    def pack(self, seq_id, control=False):
+        if control:
+            return WIDE.pack(WIDE_VERSION, self.flags | FLAG_CONTROL, 0) + self.suffix
+        return WIDE.pack(WIDE_VERSION, self.flags, seq_id) + self.suffix
+
+    def parse(self, packet, conn_id=False):
+        """like StockHeader.parse, the flags say whether a connection id follows."""
+        _, flags, seq_id = WIDE.unpack_from(packet)
+        offset, conn = WIDE.size, 0
+        if flags & FLAG_CONN_ID:
+            conn, = CONN_ID.unpack_from(packet, offset)
+            offset += CONN_ID.size
+        return seq_id, bool(flags & FLAG_CONTROL), conn, offset
+
+
+# what the receiver answers with, acks carry no connection id
+STOCK_ACKS = StockHeader()
+WIDE_ACKS = WideHeader()
+
+
+def header_for(packet):
+    """the header a packet was sent with, without a connection id, for parsing it and answering."""
+    return WIDE_ACKS if packet[:1] == bytes([WIDE_VERSION]) else STOCK_ACKS
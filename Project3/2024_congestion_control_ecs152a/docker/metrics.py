@@ -0,0 +1,189 @@
+"""Transfer metrics computed as the samples arrive, in constant memory.
+
+Every rtt sample goes through TransferMetrics.on_delay and nothing is
+kept per packet, so an hours-long run costs the same few floats as a
+short one:
+
+* mean, variance, min and max with Welford's online algorithm;
+* jitter both as the mean absolute difference between consecutive
+  delays, which is what the assignment's metric uses, and as the RFC 3550
+  (section 6.4.1) running estimate J += (|D| - J) / 16;
+* delay percentiles with the P-square algorithm (Jain and Chlamtac,
+  1985), five markers per percentile instead of every sample.
+
+Throughput counts every byte put on the wire, headers and retransmissions
+included; goodput only the payload bytes of the file, each once. Both
+are in bytes per second. The assignment's metric is
+0.2 * throughput / 2000 + 0.1 / jitter + 0.8 / delay; jitter and delay
+are floored at MIN_TIME so a run where they come out zero (or have no
+samples) still gets a number.
+"""
+import math
+
+# the delay percentiles every sender reports
+PERCENTILES = (0.5, 0.99)
+# smallest delay or jitter the metric divides by, below the resolution worth trusting
+MIN_TIME = 1e-6
+# RFC 3550's gain for the jitter estimate
+JITTER_GAIN = 1 / 16
+
+
+class RunningStats:
+    """Count, mean, variance, min and max of a stream, by Welford's method."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def variance(self):
+        """the sample variance, 0 with fewer than two values."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+    def merge(self, other):
+        """the stats of both streams together (Chan et al.), neither is changed."""
+        merged = RunningStats()
+        merged.count = self.count + other.count
+        if merged.count == 0:
+            return merged
+        delta = other.mean - self.mean
+        merged.mean = self.mean + delta * other.count / merged.count
+        merged.m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / merged.count
+        merged.min = min(self.min, other.min)
+        merged.max = max(self.max, other.max)
+        return merged
+
+
+class P2Quantile:
+    """One quantile of a stream, estimated with five markers (the P-square algorithm).
+
+    The markers sit at the minimum, the maximum, the quantile and halfway
+    to it on either side; each value moves the marker positions and
+    nudges the heights with a piecewise-parabolic fit.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []  # the first five values, then the marker heights
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        positions = self.positions
+        for i in (1, 2, 3):
+            offset = self.desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (offset <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        """the estimate, exact while there are five values or fewer, None before the first."""
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            return self.heights[min(len(self.heights) - 1, int(self.p * len(self.heights)))]
+        return self.heights[2]
+
+
+class JitterEstimator:
+    """Delay variation between consecutive samples, both as a plain mean and RFC 3550's running estimate."""
+
+    def __init__(self):
+        self.last = None
+        self.rfc3550 = 0.0
+        self.differences = RunningStats()  # of |D|, the mean is the assignment's jitter
+
+    def add(self, delay):
+        if self.last is not None:
+            difference = abs(delay - self.last)
+            self.rfc3550 += JITTER_GAIN * (difference - self.rfc3550)
+            self.differences.add(difference)
+        self.last = delay
+
+
+class TransferMetrics:
+    """Delay, jitter and delay percentiles of one transfer, fed one rtt sample at a time."""
+
+    def __init__(self, percentiles=PERCENTILES):
+        self.delay = RunningStats()
+        self.jitter = JitterEstimator()
+        self.percentiles = {p: P2Quantile(p) for p in percentiles}
+
+    def on_delay(self, delay):
+        self.delay.add(delay)
+        self.jitter.add(delay)
+        for estimator in self.percentiles.values():
+            estimator.add(delay)
+
+
+def performance_metric(throughput, avg_jitter, avg_delay):
+    """the assignment's metric, throughput in bytes/s, with jitter and delay floored at MIN_TIME."""
+    return 0.2 * (throughput / 2000) + 0.1 / max(avg_jitter, MIN_TIME) + 0.8 / max(avg_delay, MIN_TIME)
+
+
+def print_report(runtime):
+    """the metrics every sender prints once its SenderRuntime has finished."""
+    elapsed = runtime.end_time - runtime.start_time
+    throughput = runtime.total_bytes / elapsed if elapsed > 0 else 0.0
+    goodput = runtime.new_bytes / elapsed if elapsed > 0 else 0.0
+    metrics = runtime.metrics
+    avg_delay = metrics.delay.mean
+    avg_jitter = metrics.jitter.differences.mean
+    percentiles = ", ".join(f"p{round(p * 100)} {round(estimator.value() or 0, 7)}"
+                            for p, estimator in metrics.percentiles.items())
+
+    print(f"Throughput (bytes/s): {round(throughput, 7)}")
+    print(f"Goodput (bytes/s): {round(goodput, 7)}")
+    print(f"Avg Packet Delay (s): {round(avg_delay, 7)}")
+    print(f"Packet Delay percentiles (s): {percentiles}")
+    print(f"Avg Jitter (s): {round(avg_jitter, 7)}")
+    print(f"RFC 3550 Jitter (s): {round(metrics.jitter.rfc3550, 7)}")
+    print(f"Metric: {round(performance_metric(throughput, avg_jitter, avg_delay), 7)}")
+    print(f"New bytes sent: {runtime.new_bytes}")
+    print(f"Resent bytes: {runtime.resent_bytes}")
@@ -0,0 +1,47 @@
+"""Packet pacing: spread the window over one rtt instead of sending it as a burst."""
+
+# rate multiplier over cwnd/srtt, a little above 1 so pacing alone never caps the window
+DEFAULT_GAIN = 1.25
+
+
+class Pacer:
+    """Releases packets at gain * cwnd / srtt bytes per second.
+
+    Times come from the caller (the sender runtime uses time.monotonic()).
+    Until the first rtt sample there is no rate and packets are not held
+    back. After an idle period the schedule restarts from now rather than
+    letting the unused time turn into a burst.
+    """
+
+    def __init__(self, gain=DEFAULT_GAIN, trace=False):
+        self.gain = gain
+        self.rate = None  # bytes per second, None until srtt is known
+        self.next_time = 0.0  # earliest time the next packet may leave
+        self.trace = [] if trace else None  # (time, rate) every time the rate changes
+
+    def update(self, window, srtt, now):
+        """recompute the rate from the current window (bytes) and smoothed rtt (seconds)."""
+        if srtt:
+            self.set_rate(self.gain * window / srtt, now)
+
+    def set_rate(self, rate, now):
+        """pace at rate bytes per second from now on."""
+        if rate != self.rate:
+            self.rate = rate
+            if self.trace is not None:
+                self.trace.append((now, rate))
+
+    def next_send_time(self, now):
+        return self.next_time if self.rate else now
+
+    def on_send(self, now, size):
+        if self.rate:
+            self.next_time = max(self.next_time, now) + size / self.rate
+
+    def write_trace(self, path):
+        """dump the rate trace as csv: seconds since the first entry, rate in bits per second."""
+        with open(path, 'w') as f:
+            f.write("time_s,rate_bps\n")
+            start = self.trace[0][0] if self.trace else 0
+            for now, rate in self.trace:
+                f.write(f"{now - start:.6f},{rate * 8:.1f}\n")
@@ -0,0 +1,98 @@
+"""Parallel sender: stripes one file across N congestion-controlled flows.
+
+The file is cut into N contiguous ranges (see striping.py) and each range
+goes out as its own transfer, in its own thread, with its own controller,
+source port and connection id. Every flow's hello tells the receiver where
+its range starts; run the receiver with --merge N --conn-id to put the
+file back together.
+
+One flow gets one cwnd's share of the bottleneck and sends nothing while
+it waits out an RTO; N flows get N shares and the others keep going while
+one waits. Per-stream and aggregate throughput show whether that beats a
+single flow on a given link, --streams 1 is the single-flow baseline.
+"""
+import argparse
+import threading
+
+from bbr import BBR, BBRPacer
+from metrics import RunningStats
+from pacing import DEFAULT_GAIN, Pacer
+from runtime import MESSAGE_SIZE, SenderRuntime
+from sender import ALGORITHMS
+from source import MmapSource, RangeSource
+from striping import split_ranges
+
+STREAMS = 4
+
+
+def send_stripe(index, source, start, end, algorithm, sack, pacing_gain, local_port, results):
+    controller = ALGORITHMS[algorithm]()
+    # bbr always paces at its model's rate, the others only when asked to
+    if isinstance(controller, BBR):
+        pacer = BBRPacer(controller)
+    else:
+        pacer = Pacer(pacing_gain) if pacing_gain else None
+    runtime = SenderRuntime(RangeSource(source, start, end), controller, selective_repeat=sack, sack=sack,
+                            pacer=pacer, bind=('localhost', local_port + index if local_port else 0),
+                            conn_id=index, stripe_offset=start)
+    try:
+        runtime.run()
+    except ConnectionError as e:
+        print(f"Stream {index}: {e}")
+        return
+    results[index] = runtime
+
+
+def main(path='file.mp3', streams=STREAMS, algorithm="reno", sack=False, pacing_gain=None, local_port=0):
+    with MmapSource(path) as source:
+        ranges = split_ranges(source.length, streams, MESSAGE_SIZE)
+        results = [None] * len(ranges)
+        threads = [threading.Thread(target=send_stripe,
+                                    args=(i, source, start, end, algorithm, sack, pacing_gain, local_port, results))
+                   for i, (start, end) in enumerate(ranges)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    done = [runtime for runtime in results if runtime is not None]
+    print(f"Algorithm: {algorithm}, streams: {len(ranges)}")
+    for i, ((start, end), runtime) in enumerate(zip(ranges, results)):
+        if runtime is None:
+            print(f"Stream {i} [{start}, {end}): failed")
+            continue
+        elapsed = runtime.end_time - runtime.start_time
+        print(f"Stream {i} [{start}, {end}): {elapsed:.3f} s, throughput (bytes/s) {round(runtime.total_bytes / elapsed, 7)}, "
+              f"resent bytes {runtime.resent_bytes}")
+    if not done:
+        return
+
+    # the transfer is over when its last stripe is
+    elapsed = max(r.end_time for r in done) - min(r.start_time for r in done)
+    delays = RunningStats()
+    for r in done:
+        delays = delays.merge(r.metrics.delay)
+    print(f"Aggregate throughput (bytes/s): {round(sum(r.total_bytes for r in done) / elapsed, 7)}")
+    print(f"Aggregate goodput (bytes/s): {round(sum(end - start for start, end in ranges) / elapsed, 7)}")
+    print(f"Avg Packet Delay (s): {round(delays.mean, 7)}")
+    print(f"New bytes sent: {sum(r.new_bytes for r in done)}")
+    print(f"Resent bytes: {sum(r.resent_bytes for r in done)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sender that stripes one file across parallel flows")
+    parser.add_argument("--streams", type=int, default=STREAMS, metavar="N",
+                        help="parallel flows, the receiver needs --merge N --conn-id (default %(default)s)")
+    parser.add_argument("--cc", choices=sorted(ALGORITHMS), default="reno",
+                        help="congestion control algorithm of every flow (default %(default)s)")
+    parser.add_argument("--sack", action="store_true",
+                        help="use the receiver's SACK blocks to resend only the holes")
+    parser.add_argument("--pacing", action="store_true",
+                        help="pace every flow at gain * cwnd / srtt")
+    parser.add_argument("--pacing-gain", type=float, default=DEFAULT_GAIN, metavar="G",
+                        help="pacing rate multiplier over cwnd / srtt (default %(default)s)")
+    parser.add_argument("--local-port", type=int, default=0,
+                        help="first source port, stream i sends from it + i (default 0 picks free ones)")
+    parser.add_argument("--file", default="file.mp3", help="file to send, a regular file (default %(default)s)")
+    args = parser.parse_args()
+    main(path=args.file, streams=args.streams, algorithm=args.cc, sack=args.sack,
+         pacing_gain=args.pacing_gain if args.pacing else None, local_port=args.local_port)
@@ -0,0 +1,63 @@
+"""Plot a sender's --trace file: cwnd, ssthresh and bytes in flight over time, with the rtt samples below.
+
+Fast retransmits and timeouts are marked on the window plot. Needs
+matplotlib, the trace itself is read with acktrace.load.
+
+    python3 sender_reno.py --trace reno.npy
+    python3 plot_trace.py reno.npy --output reno.png
+"""
+import argparse
+import math
+import sys
+
+from acktrace import ACK, DUP_ACK, EVENTS, FAST_RETRANSMIT, TIMEOUT, load
+
+
+def plot(records, title, output=None):
+    import matplotlib
+    if output:
+        matplotlib.use('Agg')  # no display needed to write a file
+    import matplotlib.pyplot as plt
+
+    acks = [r for r in records if r.event in (ACK, DUP_ACK)]
+    figure, (window, rtt) = plt.subplots(2, 1, sharex=True, figsize=(10, 7), height_ratios=(2, 1))
+    times = [r.time for r in acks]
+    window.plot(times, [r.cwnd for r in acks], label='cwnd', linewidth=1)
+    # ssthresh starts out huge (or infinite) and would flatten everything else
+    ceiling = max([r.cwnd for r in acks] + [r.inflight for r in acks], default=1) * 1.5
+    window.plot(times, [r.ssthresh if r.ssthresh <= ceiling else math.nan for r in acks],
+                label='ssthresh', linestyle='--', linewidth=1)
+    window.plot(times, [r.inflight for r in acks], label='in flight', linewidth=0.7, alpha=0.7)
+    for event, marker in ((FAST_RETRANSMIT, 'v'), (TIMEOUT, 'x')):
+        marked = [r for r in records if r.event == event]
+        if marked:
+            window.scatter([r.time for r in marked], [r.cwnd for r in marked], marker=marker, color='red',
+                           zorder=3, label=f"{EVENTS[event]} ({len(marked)})")
+    window.set_ylabel('bytes')
+    window.set_title(title)
+    window.legend(loc='upper right')
+
+    samples = [r for r in acks if not math.isnan(r.rtt)]
+    rtt.scatter([r.time for r in samples], [r.rtt * 1000 for r in samples], s=2)
+    rtt.set_xlabel('time (s)')
+    rtt.set_ylabel('rtt sample (ms)')
+
+    figure.tight_layout()
+    if output:
+        figure.savefig(output, dpi=150)
+    else:
+        plt.show()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="plot a sender's ack trace")
+    parser.add_argument("trace", help="file written by a sender's --trace")
+    parser.add_argument("--output", metavar="FILE", help="save the plot to FILE instead of showing it")
+    args = parser.parse_args()
+    records = load(args.trace)
+    counts = ", ".join(f"{sum(r.event == event for r in records)} {name}" for event, name in EVENTS.items())
+    print(f"{len(records)} records: {counts}")
+    try:
+        plot(records, args.trace, args.output)
+    except ImportError:
+        sys.exit("plotting needs matplotlib: pip install matplotlib")
@@ -0,0 +1,58 @@
+"""Sorted set of disjoint byte ranges, the receiver's record of what arrived."""
+import bisect
+
+
+class RangeSet:
+    """Half-open [start, end) ranges, merged whenever they overlap or touch.
+
+    Starts and ends live in two parallel sorted lists, so finding where a
+    range goes is a binary search and merging replaces a slice.
+
+    The slice moves the tail, O(n) in the number of ranges, but the
+    reassembler bounds n: it holds at most its buffer above the next
+    expected byte, so buffer / (2 * segment) ranges, 514 for the default
+    1 MiB and 1020-byte segments. Moving that many pointers is cheaper than
+    a tree's log-time insert in Python; bench_rangeset.py has the numbers.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def add(self, start, end):
+        """insert [start, end), merging every range it overlaps or touches."""
+        if start >= end:
+            return
+        i = bisect.bisect_left(self.ends, start)  # first range ending at or after start
+        j = bisect.bisect_right(self.starts, end)  # past the last range starting at or before end
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def covers(self, start, end):
+        """True if every byte of [start, end) is already in the set."""
+        i = bisect.bisect_right(self.starts, start) - 1
+        return i >= 0 and self.ends[i] >= end
+
+    def containing(self, offset):
+        """the (start, end) range holding offset, or None."""
+        i = bisect.bisect_right(self.starts, offset) - 1
+        if i >= 0 and offset < self.ends[i]:
+            return self.starts[i], self.ends[i]
+        return None
+
+    def discard_below(self, offset):
+        """forget everything before offset."""
+        i = bisect.bisect_right(self.ends, offset)
+        del self.starts[:i]
+        del self.ends[:i]
+        if self.starts and self.starts[0] < offset:
+            self.starts[0] = offset
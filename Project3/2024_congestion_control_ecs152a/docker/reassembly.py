@@ -0,0 +1,78 @@
+"""Receiver-side reassembly straight into the output file.
+
+In-order data is written out as soon as it arrives. Only segments that
+arrive ahead of a hole are held, in a buffer of fixed capacity, and they
+are flushed as soon as the hole is filled. What is left of that buffer is
+the window the receiver advertises.
+
+Segments don't have to share a size or boundaries: a retransmission may
+overlap data that already arrived, and only its new bytes are written.
+"""
+import heapq
+
+from rangeset import RangeSet
+
+# bytes of out-of-order data the receiver holds before dropping segments
+RECV_BUFFER = 1 << 20
+
+
+class Reassembler:
+    """Writes a byte stream to out in order, whatever order the segments come in."""
+
+    def __init__(self, out, capacity=RECV_BUFFER):
+        self.out = out
+        self.capacity = capacity
+        self.expected = 0  # next byte to write, the cumulative ack
+        self.pending = {}  # seq_id -> payload held above expected
+        self.starts = []  # heap of the seq ids in pending
+        self.ranges = RangeSet()  # bytes held above expected, the sack blocks
+        self.buffered = 0  # bytes in pending
+        # counters for the receiver's stats
+        self.duplicates = 0  # segments with nothing new in them
+        self.out_of_order = 0  # segments that arrived ahead of a hole
+        self.overflows = 0  # segments dropped for want of buffer space
+
+    def window(self):
+        """free buffer space to advertise, in bytes."""
+        return self.capacity - self.buffered
+
+    def add(self, seq_id, payload):
+        """take one segment, False if it was a duplicate or there was no room for it."""
+        end = seq_id + len(payload)
+        if end <= self.expected or self.ranges.covers(seq_id, end):
+            if payload:  # the empty end-of-transfer segment is not a duplicate
+                self.duplicates += 1
+            return False
+
+        if seq_id > self.expected:
+            self.out_of_order += 1
+            held = self.pending.get(seq_id)
+            grows = len(payload) - (len(held) if held is not None else 0)
+            if self.buffered + grows > self.capacity:
+                self.overflows += 1
+                return False
+            if held is None:
+                heapq.heappush(self.starts, seq_id)
+            self.pending[seq_id] = payload  # a longer copy replaces a shorter one
+            self.buffered += grows
+            self.ranges.add(seq_id, end)
+            return True
+
+        self._write(payload[self.expected - seq_id:])
+        self._flush()
+        return True
+
+    def _flush(self):
+        """write every held segment the cumulative ack has reached."""
+        starts = self.starts
+        while starts and starts[0] <= self.expected:
+            seq_id = heapq.heappop(starts)
+            payload = self.pending.pop(seq_id)
+            self.buffered -= len(payload)
+            if seq_id + len(payload) > self.expected:
+                self._write(payload[self.expected - seq_id:])
+        self.ranges.discard_below(self.expected)
+
+    def _write(self, payload):
+        self.out.write(payload)
+        self.expected += len(payload)
@@ -1,65 +1,292 @@
-import random
+import argparse
+import os
+import select
 import socket
+import time
+
+from ackpolicy import ACK_DELAY, ACK_EVERY
+from batchio import DatagramBatch
+from connections import FIN_RETRIES, IDLE_TIMEOUT, ConnectionTable
+from fec import OVERHEAD, PARITY_TAG, FecDecoder, encode_report
+from handshake import MAX_SEGMENT, answer, decode_stripe_offset
+from header import CONN_ID, STOCK_ACKS, WIDE, header_for
+from reassembly import RECV_BUFFER
+from sack import encode_rwnd, encode_sack_blocks, out_of_order_blocks
+from stats import ReceiverStats, close_stats, serve_stats
+from striping import StripeWriter
 
 PACKET_SIZE = 1024
 SEQ_ID_SIZE = 4
 MESSAGE_SIZE = PACKET_SIZE - SEQ_ID_SIZE
-EXPECTED_SEQ_ID = 0
-RECEIVED_DATA = {}
 
-def create_acknowledgement(seq_id, message):
-    return int.to_bytes(seq_id, SEQ_ID_SIZE, signed=True, byteorder='big') + message.encode()
+parser = argparse.ArgumentParser(description="ECS 152A receiver")
+parser.add_argument("--sack", type=int, default=0, metavar="N",
+                    help="append up to N SACK blocks to every ack (default 0 keeps the stock ack)")
+parser.add_argument("--buffer", type=int, default=RECV_BUFFER, metavar="BYTES",
+                    help="out-of-order buffer size, advertised to the sender as its window (default %(default)s)")
+parser.add_argument("--output", default="/hdd/file2.mp3",
+                    help="where to write the received file, with --multi a template that may use "
+                         "{host}, {port} and {conn} (default %(default)s)")
+parser.add_argument("--ack-every", type=int, default=ACK_EVERY, metavar="N",
+                    help="ack every N in-order segments, gaps are always acked at once (default %(default)s)")
+parser.add_argument("--ack-delay", type=float, default=ACK_DELAY, metavar="SECONDS",
+                    help="longest an in-order segment waits for its ack (default %(default)s)")
+parser.add_argument("--multi", action="store_true",
+                    help="serve concurrent transfers and keep running after each FINACK")
+parser.add_argument("--conn-id", action="store_true",
+                    help="senders put a 4-byte connection id after the stock sequence id (the wide header flags its own)")
+parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT, metavar="SECONDS",
+                    help="with --multi, drop a connection after this long without a packet (default %(default)s)")
+parser.add_argument("--batch", type=int, default=0, metavar="N",
+                    help="receive and ack up to N datagrams per system call with recvmmsg/sendmmsg (default 0, off)")
+parser.add_argument("--max-segment", type=int, default=MAX_SEGMENT, metavar="BYTES",
+                    help="largest segment payload accepted, and agreed to in a sender's handshake (default %(default)s)")
+parser.add_argument("--merge", type=int, default=0, metavar="N",
+                    help="merge the N stripes of a parallel_sender.py transfer into --output, stop once all N finish")
+parser.add_argument("--stats", metavar="ADDRESS",
+                    help="serve live counters in Prometheus text format over http on a port, host:port "
+                         "or a UNIX socket path (default off)")
+parser.add_argument("--port", type=int, default=5001, help="port to listen on (default %(default)s)")
+args = parser.parse_args()
+SACK_BLOCKS = args.sack
+# largest datagram we take, anything longer is truncated, fec parity is a little longer than data
+RECV_SIZE = args.max_segment + WIDE.size + CONN_ID.size + OVERHEAD
+
+def create_acknowledgement(seq_id, message, header=STOCK_ACKS):
+    return header.pack(seq_id) + message.encode()
+
+def send_acknowledgement(connection):
+    reassembler = connection.reassembler
+    client = connection.key[0]
+    header = connection.header
+
+    # create the acknowledgement in the sender's header format, advertising the free buffer space
+    acknowledgement = create_acknowledgement(reassembler.expected, 'ack', header) + encode_rwnd(reassembler.window())
+
+    # report out of order data so the sender can resend only the holes
+    if SACK_BLOCKS:
+        blocks = out_of_order_blocks(reassembler.ranges, connection.latest_seq_id, SACK_BLOCKS)
+        acknowledgement += encode_sack_blocks(blocks, header.sack_block)
+
+    # send the acknowledgement
+    send(acknowledgement, client)
+    connection.policy.on_ack_sent()
+
+def open_output(key):
+    if args.merge:
+        return StripeWriter(merged)
+    (host, port), conn_id = key
+    path = args.output
+    if args.multi:
+        if '{' in path:
+            path = path.format(host=host, port=port, conn=conn_id)
+        else:
+            path = f"{path}.{host}-{port}-{conn_id}"
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    return open(path, 'wb')
+
+def report(connection, reason):
+    elapsed = connection.last_seen - connection.started
+    received = connection.reassembler.expected
+    segments = f", {connection.segment_size} byte segments" if connection.segment_size else ""
+    stripe = f", stripe at {connection.out.base}" if args.merge else ""
+    fec = f", {connection.fec.recovered} segments rebuilt from parity" if connection.fec else ""
+    print(f"{reason} {connection.key}: {received} bytes in {elapsed:.3f} s{segments}{stripe}{fec}. "
+          f"{connection.policy.summary()}")
+
+# with --merge every stripe writes into this one file at its own offset
+merged = open(args.output, 'wb', buffering=0) if args.merge else None
+
+# one entry per transfer: in-order data goes straight to its file, only out-of-order segments are held
+table = ConnectionTable(open_output, args.idle_timeout if args.multi else None,
+                        buffer=args.buffer, ack_every=args.ack_every, ack_delay=args.ack_delay)
+# counted in the receive loop, formatted by the stats thread only when someone asks
+stats = ReceiverStats(table)
+
+def send(datagram, client):
+    """send now, or queue for the next sendmmsg when batching."""
+    if io is not None:
+        io.queue(client, datagram)
+    else:
+        udp_socket.sendto(datagram, client)
+
+def repair(connection, rebuilt):
+    """hand segments rebuilt from parity to the reassembler as if they had arrived."""
+    for seq_id, payload in rebuilt:
+        connection.reassembler.add(seq_id, payload)
+
+def on_parity(message, key, header, now):
+    """rebuild what a parity packet lets us, then tell the sender how many datagrams got here."""
+    connection = table.get(key, now)
+    if connection is None or (args.merge and connection.out.base is None):
+        return
+    connection.header = header
+    connection.datagrams += 1
+    if connection.fec is None:
+        connection.fec = FecDecoder.from_parity(message)
+    sent, rebuilt = connection.fec.on_parity(message, connection.reassembler.expected)
+    repair(connection, rebuilt)
+    send(header.pack(0, control=True) + encode_report(sent, connection.datagrams), key[0])
+    # the acks held back while the block's parity was on its way go out now
+    if rebuilt or connection.reassembler.buffered:
+        send_acknowledgement(connection)
+
+def send_fin(connection, now):
+    """all data is in: ack the empty segment and send fin, again later if no FINACK follows."""
+    ack_id = connection.reassembler.expected
+    send(create_acknowledgement(ack_id, 'ack', connection.header), connection.key[0])
+    send(create_acknowledgement(ack_id + 3, 'fin', connection.header), connection.key[0])
+    connection.fin_sent(now)
+
+def finish(key, now, reason):
+    """close a transfer that's done, True when the receiver should stop."""
+    with stats.lock:
+        connection = table.finish(key, now)
+        if connection is not None:
+            stats.retire(connection)
+    if connection is not None:
+        report(connection, reason)
+    if args.merge:
+        return len(table.finished) >= args.merge
+    return not args.multi
+
+def on_packet(packet, client, now):
+    """handle one datagram, True when the receiver should stop."""
+    stats.datagrams += 1
+    stats.bytes += len(packet)
+
+    # get the message id, from the stock header or the wide one
+    header = header_for(packet)
+    seq_id, control, conn_id, offset = header.parse(packet, args.conn_id)
+    message = packet[offset:]
+    key = (client, conn_id)
+
+    # hello or mtu probe: answer it and remember the largest segment size agreed or probed
+    if control:
+        if message.startswith(PARITY_TAG):
+            on_parity(message, key, header, now)
+            return False
+        reply, segment_size = answer(message, args.max_segment)
+        if reply is None:
+            return False
+        connection = table.get(key, now)
+        if connection is not None:
+            connection.header = header
+            connection.segment_size = max(connection.segment_size or 0, segment_size)
+            if args.merge and decode_stripe_offset(message) is not None:
+                connection.out.base = decode_stripe_offset(message)
+        send(header.pack(0, control=True) + reply, client)
+        return False
+
+    # check if finack message
+    if message == b'==FINACK==':
+        return finish(key, now, "Finished")
+
+    connection = table.get(key, now)
+    if connection is None:
+        return False  # a straggler for a transfer that already finished
+    if args.merge and connection.out.base is None:
+        return False  # a stripe's data is no use before its hello says where it goes
+    reassembler = connection.reassembler
+    connection.header = header
+    connection.datagrams += 1
+
+    # out of order, filling a hole, a duplicate or the end: the sender needs to know now
+    immediate = seq_id != reassembler.expected or reassembler.buffered > 0 or len(message) == 0
+
+    # write it out if it's next, hold it if it's ahead of a hole
+    reassembler.add(seq_id, message)
+    connection.latest_seq_id = seq_id
+
+    # with fec, keep the data for rebuilding its block's losses, and don't ack past a hole its parity may still fill
+    held = False
+    if connection.fec is not None and len(message):
+        rebuilt = connection.fec.on_data(seq_id, message, reassembler.expected)
+        repair(connection, rebuilt)
+        held = not rebuilt and seq_id > reassembler.expected and connection.fec.hold(reassembler.expected)
+
+    # create ack id
+    ack_id = reassembler.expected
+
+    # ack now, or leave it to the next segment or the delayed-ack timer
+    if held:
+        connection.policy.hold(now)
+    elif connection.policy.on_segment(now, immediate):
+        send_acknowledgement(connection)
+
+    # check if all data received (empty message)
+    if len(message) == 0 and ack_id == seq_id:
+        send_fin(connection, now)
+    return False
 
 # create a udp socket
 with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
     # bind the socket to a OS port
-    # bind to 0.0.0.0 so external 
-    udp_socket.bind(("0.0.0.0", 5001))
+    # bind to 0.0.0.0 so external
+    udp_socket.bind(("0.0.0.0", args.port))
+    # let the kernel queue about as much as we advertise, the default (~200 KB, some 90 datagrams)
+    # overflows as soon as a window arrives in one sendmmsg burst
+    udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, args.buffer)
+
+    # with --batch every wakeup drains the socket with one recvmmsg and the acks go out with one sendmmsg
+    io = None
+    if args.batch:
+        udp_socket.setblocking(False)
+        io = DatagramBatch(udp_socket, args.batch, RECV_SIZE)
+
+    stats_server = serve_stats(stats, args.stats) if args.stats else None
 
     print("Receiver running")
-    # start receiving packets
-    while True:
-        timeouts = 0
-        try:
-            # receive the packet
-            packet, client = udp_socket.recvfrom(PACKET_SIZE)
-            
-            # get the message id
-            seq_id, message = packet[:SEQ_ID_SIZE], packet[SEQ_ID_SIZE:]
-            
-            # check if finack message
-            if message == b'==FINACK==':
-                break
-            
-            # if the message id is -1, we have received all the packets
-            seq_id = int.from_bytes(seq_id, signed=True, byteorder='big')
-            
-            # keep track of received sequences
-            RECEIVED_DATA[seq_id] = message
-            
-            # check if sequence id is same as expected and move forward
-            if seq_id <= EXPECTED_SEQ_ID and len(RECEIVED_DATA[seq_id]) > 0:
-                while EXPECTED_SEQ_ID in RECEIVED_DATA:
-                    EXPECTED_SEQ_ID += len(RECEIVED_DATA[seq_id])
-            
-            # create ack id
-            ack_id = EXPECTED_SEQ_ID
-            
-            # create the acknowledgement
-            acknowledgement = create_acknowledgement(ack_id, 'ack')
-
-            # send the acknowledgement
-            udp_socket.sendto(acknowledgement, client)
-            
-            # check if all data received (empty message)
-            if len(message) == 0 and ack_id == seq_id:
-                ack = create_acknowledgement(ack_id, 'ack')
-                fin = create_acknowledgement(ack_id + 3, 'fin')
-                udp_socket.sendto(ack, client)
-                udp_socket.sendto(fin, client)
-        except socket.timeout:
-            timeouts += 1
-
-with open('/hdd/file2.mp3', 'wb') as f:
-    for sid in sorted(RECEIVED_DATA.keys()):
-        f.write(RECEIVED_DATA[sid])
\ No newline at end of file
+    # start receiving packets, files still open when we stop (ctrl-c) get closed on the way out
+    try:
+        stop = False
+        while not stop:
+            # don't block past the next delayed ack or idle sweep
+            wait = table.wait_time(time.monotonic())
+            if io is not None:
+                packets = io.recv() if select.select([udp_socket], [], [], wait)[0] else []
+            else:
+                udp_socket.settimeout(wait)
+                try:
+                    # receive the packet
+                    packets = [udp_socket.recvfrom(RECV_SIZE)]
+                except socket.timeout:
+                    packets = []
+            now = time.monotonic()
+
+            for packet, client in packets:
+                stop = on_packet(packet, client, now)
+                if stop:
+                    break
+
+            # on every wakeup, under steady arrivals from any client there may never be an empty one
+            for connection in table.connections.values():
+                if connection.policy.on_timer(now):
+                    send_acknowledgement(connection)
+            # a lost FINACK: ask again, and after FIN_RETRIES close the transfer, its data is all written
+            for connection in table.fin_due(now):
+                if connection.fin_resends < FIN_RETRIES:
+                    connection.fin_resends += 1
+                    send_fin(connection, now)
+                else:
+                    stop = finish(connection.key, now, "Finished without FINACK") or stop
+            if io is not None:
+                io.flush()
+
+            with stats.lock:
+                expired = table.expire(now)
+                for connection in expired:
+                    stats.retire(connection)
+            for connection in expired:
+                report(connection, "Idle, dropped")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for connection in table.connections.values():
+            connection.close()
+        if merged is not None:
+            merged.close()
+        if io is not None:
+            print(io.summary())
+        if stats_server is not None:
+            close_stats(stats_server)
@@ -0,0 +1,83 @@
+"""Retransmission timer shared by the senders (RFC 6298)."""
+
+# gain for the smoothed rtt
+ALPHA = 1 / 8
+# gain for the rtt variance
+BETA = 1 / 4
+# multiplier applied to the rtt variance
+K = 4
+# clock granularity (time.time() is well below a millisecond)
+CLOCK_GRANULARITY = 0.001
+
+# rto before the first rtt sample (RFC 6298 section 2.1)
+INITIAL_RTO = 1.0
+# lower bound, 200 ms like linux instead of the RFC's conservative 1 s
+MIN_RTO = 0.2
+# upper bound reached by exponential backoff
+MAX_RTO = 60.0
+
+
+def acked_seq_id(ack_id, message_size):
+    """seq id of the last segment covered by the cumulative ack_id."""
+    return (ack_id - 1) // message_size * message_size
+
+
+class RetransmissionTimer:
+    """Tracks srtt/rttvar for one flow and derives the current rto."""
+
+    def __init__(self, initial_rto=INITIAL_RTO, min_rto=MIN_RTO, max_rto=MAX_RTO):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+        self.backoffs = 0  # consecutive timeouts without a valid sample
+        self.retransmitted = set()  # unacked seq ids that were sent more than once
+        self.lowest_retransmitted = None  # the smallest of them
+
+    def mark_retransmitted(self, seq_id):
+        """remember that seq_id was resent so its ack is ambiguous."""
+        self.retransmitted.add(seq_id)
+        if self.lowest_retransmitted is None or seq_id < self.lowest_retransmitted:
+            self.lowest_retransmitted = seq_id
+
+    def forget_below(self, ack_id):
+        """the cumulative ack passed ack_id, resends below it can't make a later ack ambiguous."""
+        if self.lowest_retransmitted is not None and self.lowest_retransmitted < ack_id:
+            self.retransmitted = {seq_id for seq_id in self.retransmitted if seq_id >= ack_id}
+            self.lowest_retransmitted = min(self.retransmitted, default=None)
+
+    def on_sample(self, seq_id, rtt, ack_id=None):
+        """feed the rtt measured for seq_id, returns False if it was discarded.
+
+        ack_id is the cumulative ack that carried the sample. A resent
+        segment anywhere below it makes the sample ambiguous too: when a
+        resend fills a hole, the ack jumps over data that was held out of
+        order, and timing that data measures the rto, not the rtt.
+        """
+        # karn's rule: an ack for a resent segment may belong to either copy
+        if seq_id in self.retransmitted:
+            return False
+        if ack_id is not None and self.lowest_retransmitted is not None and self.lowest_retransmitted < ack_id:
+            return False
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+
+        # a valid sample collapses any backoff still in effect
+        self.backoffs = 0
+        self.rto = self._clamp(self.srtt + max(CLOCK_GRANULARITY, K * self.rttvar))
+        return True
+
+    def backoff(self):
+        """double the rto after a timeout (RFC 6298 section 5.5)."""
+        self.backoffs += 1
+        self.rto = self._clamp(self.rto * 2)
+        return self.rto
+
+    def _clamp(self, rto):
+        return min(max(rto, self.min_rto), self.max_rto)
@@ -0,0 +1,497 @@
+"""Event-driven sender runtime shared by the senders.
+
+One selectors loop multiplexes three things: the socket becoming readable
+(acks), the earliest retransmission deadline and, when a pacer is attached,
+the time the next packet may leave. Acks are drained as soon as they arrive
+and new data goes out right after each one, so sending is ack-clocked
+instead of waiting for a socket.timeout to end a blocking recv loop.
+"""
+import errno
+import logging
+import math
+import selectors
+import socket
+import time
+
+from acktrace import ACK, DUP_ACK, FAST_RETRANSMIT, RETRANSMIT, TIMEOUT
+from batchio import DatagramBatch
+from delivery import DeliveryRate
+from header import StockHeader, WideHeader
+from metrics import TransferMetrics
+from handshake import (HELLO_REPLY, IP_UDP_OVERHEAD, MAX_PROBES, PROBE_REPLY, ProbeSearch,
+                       decode_hello_reply, decode_probe_reply, encode_hello, encode_probe, interface_mtu,
+                       set_dont_fragment)
+from rto import RetransmissionTimer, acked_seq_id
+from sack import SackScoreboard, decode_rwnd, decode_sack_blocks
+from source import BytesSource, SegmentSource
+from timers import SegmentTimers
+
+# total packet size
+PACKET_SIZE = 1024
+# bytes reserved for sequence id
+SEQ_ID_SIZE = 4
+# bytes available for message
+MESSAGE_SIZE = PACKET_SIZE - SEQ_ID_SIZE
+
+# where the receiver listens
+RECEIVER = ('localhost', 5001)
+# attempts at the closing handshake before giving up
+FIN_RETRIES = 5
+# scatter-gather sends, not available on Windows
+SENDMSG = hasattr(socket.socket, 'sendmsg')
+# a probe waits this many handshake round trips for its reply
+PROBE_TIMEOUT_RTTS = 3
+# shortest probe wait, localhost round trips are a few microseconds
+MIN_PROBE_TIMEOUT = 0.05
+
+# for the senders' --log-level, debug logs every packet, ack and state change
+LOG_LEVELS = ('debug', 'info', 'warning', 'error')
+
+log = logging.getLogger(__name__)
+
+
+class SenderRuntime:
+    """Sends data reliably with a pluggable congestion controller.
+
+    data is either bytes or a SegmentSource (see source.py); with a source
+    the payload is read as the window reaches it and released once acked.
+
+    The controller (see congestion.py) decides how much may be in flight and
+    which segment a dup ack says is lost. Every rtt sample that survives
+    Karn's rule goes to its on_rtt_sample, and engines with uses_rate_samples
+    set also get a delivery rate sample before each new ack.
+
+    An optional pacer (see pacing.py) decides when the next packet may
+    leave; it needs next_send_time(now) returning the earliest send time,
+    on_send(now, size) called for every packet and update(window, srtt, now)
+    called after every ack.
+
+    Packets are never built by concatenation: the header is packed into a
+    reused buffer and sent together with a memoryview of the payload via
+    sendmsg scatter-gather, so the payload is not copied in Python. Where
+    sendmsg is missing (Windows) header and payload view are joined with a
+    single copy instead of slicing and then concatenating.
+
+    With a conn_id every packet, the closing ones included, carries it in 4
+    extra header bytes so a receiver run with --conn-id can tell transfers
+    from the same address apart. With wide the versioned header with a
+    64-bit offset (see header.py) is used instead of the stock 4-byte one,
+    for transfers past 2 GiB.
+
+    Segments carry segment_size bytes of payload. With handshake the sender
+    first asks the receiver for that size and uses what it agrees to; with
+    probe_mtu it then probes for the largest size that fits the path (see
+    handshake.py) and switches the controller to it before any data. A
+    stripe_offset (see parallel_sender.py) always goes out in the hello.
+
+    With an fec encoder (see fec.py) parity packets follow every block of
+    segments sent for the first time, and the receiver's reports on them
+    set how many.
+
+    With batch set (see batchio.py) each window fill goes out with one
+    sendmmsg and the acks waiting in the socket come in with one recvmmsg;
+    all of them are processed before the window is filled again. The
+    counters end up in self.io.
+
+    With a tracer (see acktrace.py) every ack, fast retransmit, timeout and
+    resent segment is recorded with cwnd, ssthresh, bytes in flight and the
+    rtt sample. Per-packet messages go to this module's logger at debug
+    level; whether it is enabled is looked up once per run, so with debug
+    off they cost one attribute check.
+
+    All times come from time.monotonic().
+    """
+
+    def __init__(self, data, controller, selective_repeat=False, sack=False, pacer=None,
+                 bind=('localhost', 5002), receiver=RECEIVER, conn_id=None, batch=None,
+                 segment_size=MESSAGE_SIZE, handshake=False, probe_mtu=False, wide=False, stripe_offset=None,
+                 fec=None, tracer=None):
+        self.source = data if isinstance(data, SegmentSource) else BytesSource(data)
+        self.controller = controller
+        self.selective_repeat = selective_repeat or sack
+        self.sack = sack
+        self.pacer = pacer
+        self.bind = bind
+        self.receiver = receiver
+        self.batch = batch
+        self.segment_size = segment_size  # payload bytes per segment
+        self.handshake = handshake or probe_mtu or stripe_offset is not None
+        self.stripe_offset = stripe_offset  # where this flow's data goes in a merged file, sent in the hello
+        self.probe_mtu = probe_mtu
+        self.handshake_time = None  # seconds the handshake and probing took
+        self.io = None  # the DatagramBatch while running with batch
+        self.fec = fec
+        self.tracer = tracer
+        self.debug = False  # whether debug logging is on, looked up once per run
+
+        self.rto_timer = RetransmissionTimer()
+        self.timers = SegmentTimers()
+        self.scoreboard = SackScoreboard(segment_size)
+        self.delivery = DeliveryRate() if controller.uses_rate_samples else None
+        self.send_times = {}  # first send time of every unacked segment, in seq order
+        self.highest_sent = 0  # end of the furthest segment sent, anything below it is a resend
+        self.highest_ack = 0  # only acks above this give rto samples
+
+        self.base_id = 0  # first unacknowledged byte
+        self.seq_id_tmp = 0  # next byte to send
+
+        # results for the metrics
+        self.metrics = TransferMetrics()  # rtt samples, summarized as they come (see metrics.py)
+        self.total_bytes = 0  # everything put on the wire, headers included
+        self.new_bytes = 0  # payload sent for the first time
+        self.resent_bytes = 0  # payload sent again
+        self.parity_bytes = 0  # fec parity packets, headers included
+        self.datagrams = 0  # data and parity packets sent, for the fec loss reports
+        self.start_time = None
+        self.end_time = None
+        self.header = (WideHeader if wide else StockHeader)(conn_id)
+
+    def run(self):
+        """send all of data, then close the connection with the receiver."""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket, \
+                selectors.DefaultSelector() as selector:
+            udp_socket.bind(self.bind)
+            udp_socket.setblocking(False)
+            selector.register(udp_socket, selectors.EVENT_READ)
+            self.udp_socket = udp_socket
+            self.debug = log.isEnabledFor(logging.DEBUG)
+            if self.handshake:
+                self._handshake(selector)
+            if self.batch:
+                overhead = self.fec.overhead if self.fec is not None else 0
+                self.io = DatagramBatch(udp_socket, self.batch, self.header.size + self.segment_size + overhead)
+
+            self.start_time = time.monotonic()
+            while self.source.has(self.base_id):
+                self._fill_window()
+                if selector.select(self._wait_time()):
+                    self._drain_acks()
+                self._check_timers()
+            self.end_time = time.monotonic()
+
+            self._close(selector)
+
+    def _fill_window(self):
+        while self.seq_id_tmp < self.base_id + self.controller.window() and self.source.has(self.seq_id_tmp):
+            now = time.monotonic()
+            if self.pacer is not None and self.pacer.next_send_time(now) > now:
+                break
+
+            seq_id = self.seq_id_tmp
+            size = self._send(seq_id, now)
+
+            if seq_id >= self.highest_sent:
+                self.send_times[seq_id] = now
+                self.highest_sent = seq_id + size
+                self.new_bytes += size
+                if self.fec is not None:
+                    self._send_parity(seq_id, now)
+            else:
+                self.rto_timer.mark_retransmitted(seq_id)  # karn's rule
+                self.resent_bytes += size
+
+            self.timers.arm(seq_id, now)
+            if self.debug:
+                log.debug(f"Sending packet with seq_id {seq_id} of size {self.header.size + size}")
+            self.seq_id_tmp += size
+        if self.io is not None:
+            self.io.flush()
+
+    def _retransmit(self, seq_id):
+        """resend one segment on its own and restart its timer."""
+        now = time.monotonic()
+        self.resent_bytes += self._send(seq_id, now)
+        self.rto_timer.mark_retransmitted(seq_id)
+        self.timers.arm(seq_id, now)
+        if self.debug:
+            log.debug(f"Resending packet with seq_id {seq_id}")
+        if self.tracer is not None:
+            self.tracer.record(now, RETRANSMIT, seq_id, self.controller.cwnd, self.controller.ssthresh,
+                               self.seq_id_tmp - self.base_id)
+
+    def _send(self, seq_id, now):
+        """put the segment starting at seq_id on the wire, returns its payload size."""
+        payload = self.source.segment(seq_id, self.segment_size)
+        size = len(payload)
+        header = self.header.data(seq_id)
+        if self.io is not None:
+            self.io.queue(self.receiver, header, payload)
+        elif SENDMSG:
+            self.udp_socket.sendmsg([header, payload], [], 0, self.receiver)
+        else:
+            self.udp_socket.sendto(header + payload, self.receiver)
+
+        self.total_bytes += len(header) + size
+        self.datagrams += 1
+        if self.delivery is not None:
+            self.delivery.on_send(seq_id, now)
+        if self.pacer is not None:
+            self.pacer.on_send(now, len(header) + size)
+        return size
+
+    def _send_parity(self, seq_id, now):
+        """hand a new segment to the fec encoder and send the parity it returns."""
+        payload = self.source.segment(seq_id, self.segment_size)
+        last = not self.source.has(seq_id + self.segment_size)
+        window = self.controller.window() // self.segment_size
+        for body in self.fec.on_segment(seq_id, payload, self.segment_size, self.datagrams, window, last):
+            packet = self.header.pack(0, control=True) + body
+            if self.io is not None:
+                self.io.queue(self.receiver, packet)
+            else:
+                self.udp_socket.sendto(packet, self.receiver)
+            self.datagrams += 1
+            self.total_bytes += len(packet)
+            self.parity_bytes += len(packet)
+            if self.pacer is not None:
+                self.pacer.on_send(now, len(packet))
+            if self.debug:
+                log.debug(f"Sending parity packet of size {len(packet)}")
+
+    def _wait_time(self):
+        """seconds until the next retransmission timer or pacing deadline."""
+        now = time.monotonic()
+        wait = self.timers.wait_time(now, self.rto_timer.rto)
+        if (self.pacer is not None and self.seq_id_tmp < self.base_id + self.controller.window()
+                and self.source.has(self.seq_id_tmp)):
+            wait = min(wait, max(self.pacer.next_send_time(now) - now, 0))
+        return wait
+
+    def _drain_acks(self):
+        if self.io is not None:
+            while True:
+                acks = self.io.recv()
+                if not acks:
+                    return
+                for ack, _ in acks:
+                    self._on_ack(ack)
+                self._fill_window()
+        while True:
+            try:
+                ack, _ = self.udp_socket.recvfrom(PACKET_SIZE)
+            except BlockingIOError:
+                return
+            self._on_ack(ack)
+            self._fill_window()  # ack clocking
+
+    def _on_ack(self, ack):
+        ack_id, control, _, offset = self.header.parse(ack)
+        if control:
+            if self.fec is not None:
+                self.fec.on_report(ack[offset:])
+            return  # otherwise a late reply to a hello or probe
+        if self.debug:
+            log.debug(f"Received ACK for seq_id {ack_id}")
+
+        # the ack carries the next expected byte, time the segment just before it
+        sample_id = acked_seq_id(ack_id, self.segment_size)
+        now = time.monotonic()
+        packet_delay = None
+        if sample_id in self.send_times:
+            packet_delay = now - self.send_times[sample_id]
+            self.metrics.on_delay(packet_delay)
+            if ack_id > self.highest_ack and self.rto_timer.on_sample(sample_id, packet_delay, ack_id):
+                self.controller.on_rtt_sample(packet_delay, now)
+        self.highest_ack = max(self.highest_ack, ack_id)
+
+        controller = self.controller
+        body = ack[offset:]
+        block = self.header.sack_block
+        rwnd = decode_rwnd(body, block)
+        if rwnd is not None:
+            controller.advertise(rwnd)
+
+        if self.delivery is not None and ack_id > self.base_id:
+            rate_sample = self.delivery.on_ack(sample_id, ack_id - self.base_id, now)
+            self.delivery.forget_below(ack_id)
+            if rate_sample is not None:
+                controller.on_rate_sample(rate_sample, now)
+
+        state = controller.state
+        lost_id = controller.on_ack(ack_id, self.seq_id_tmp)
+        if self.debug and controller.state is not state:
+            log.debug(f"{state.value} -> {controller.state.value}, cwnd = {controller.cwnd}, ssthresh = {controller.ssthresh}")
+        if self.pacer is not None:
+            self.pacer.update(controller.window(), self.rto_timer.srtt, now)
+
+        event = ACK if ack_id > self.base_id else DUP_ACK
+        if ack_id > self.base_id:
+            self.base_id = ack_id
+            self.seq_id_tmp = max(self.seq_id_tmp, ack_id)  # skip data a go-back-n rewind no longer needs
+            self.timers.ack_below(ack_id)
+            self.rto_timer.forget_below(ack_id)
+            self._forget_below(ack_id)
+            self.source.release(ack_id)
+        if self.tracer is not None:
+            rtt = packet_delay if packet_delay is not None else math.nan
+            self.tracer.record(now, event, ack_id, controller.cwnd, controller.ssthresh,
+                               self.seq_id_tmp - self.base_id, rtt)
+
+        if self.sack:
+            for seq_id in self.scoreboard.update(ack_id, decode_sack_blocks(body, block)):
+                self.timers.cancel(seq_id)
+
+        # fast retransmit, or a NewReno partial ack
+        if lost_id is not None and self.source.has(lost_id):
+            if self.debug:
+                log.debug(f"Duplicate ACKs for seq_id {ack_id} received. Fast Retransmit!")
+            if self.tracer is not None:
+                self.tracer.record(now, FAST_RETRANSMIT, lost_id, controller.cwnd, controller.ssthresh,
+                                   self.seq_id_tmp - self.base_id)
+            if not self.selective_repeat and controller.fast_retransmit_rewinds:
+                self._go_back(lost_id)
+            elif not self.sack or self.scoreboard.mark_resent(lost_id):
+                self._retransmit(lost_id)
+
+        if self.sack:
+            for seq_id in self.scoreboard.holes():
+                self._retransmit(seq_id)
+
+    def _forget_below(self, ack_id):
+        """drop the send times of segments the cumulative ack passed, the oldest are first."""
+        stale = []
+        for seq_id in self.send_times:
+            if seq_id >= ack_id:
+                break
+            stale.append(seq_id)
+        for seq_id in stale:
+            del self.send_times[seq_id]
+
+    def _check_timers(self):
+        now = time.monotonic()
+        expired = self.timers.pop_expired(now, self.rto_timer.rto)
+        if not expired:
+            return
+
+        self.rto_timer.backoff()
+        self.controller.on_timeout(self.seq_id_tmp)
+        if self.tracer is not None:
+            self.tracer.record(now, TIMEOUT, self.base_id, self.controller.cwnd, self.controller.ssthresh,
+                               self.seq_id_tmp - self.base_id)
+        if self.debug:
+            log.debug(f"Timeout occurred. cwnd = {self.controller.cwnd}, ssthresh = {self.controller.ssthresh}, "
+                      f"rto = {self.rto_timer.rto}")
+
+        if self.selective_repeat:
+            for seq_id in expired:
+                self._retransmit(seq_id)
+            if self.io is not None:
+                self.io.flush()
+        else:
+            self._go_back(self.base_id)
+
+    def _go_back(self, seq_id):
+        """go-back-n: send everything again starting at seq_id."""
+        self.seq_id_tmp = seq_id
+        self.timers.clear()
+
+    def _handshake(self, selector):
+        """agree on a segment size with the receiver, then probe for a bigger one if asked to."""
+        start = time.monotonic()
+        reply, rtt = self._control(encode_hello(self.segment_size, self.stripe_offset),
+                                   lambda body: body.startswith(HELLO_REPLY), selector, FIN_RETRIES)
+        if reply is None:
+            if self.stripe_offset is not None:
+                # without the hello the receiver can't place a single byte of the stripe
+                raise ConnectionError(f"receiver never answered the hello for the stripe at {self.stripe_offset}")
+            log.warning(f"Receiver never answered the handshake, keeping {self.segment_size} byte segments")
+            return
+        size, max_segment = decode_hello_reply(reply)
+
+        if self.probe_mtu:
+            ceiling = max_segment
+            mtu = interface_mtu(self.receiver)
+            if mtu is not None:
+                # parity packets are a little longer than data and have to fit too
+                overhead = self.fec.overhead if self.fec is not None else 0
+                ceiling = min(ceiling, mtu - IP_UDP_OVERHEAD - self.header.size - overhead)
+            set_dont_fragment(self.udp_socket)
+            timeout = max(PROBE_TIMEOUT_RTTS * rtt, MIN_PROBE_TIMEOUT)
+            search = ProbeSearch(size, ceiling)
+            while True:
+                candidate = search.next_size()
+                if candidate is None:
+                    break
+                reply, _ = self._control(encode_probe(candidate),
+                                         lambda body: body.startswith(PROBE_REPLY) and decode_probe_reply(body) == candidate,
+                                         selector, MAX_PROBES, timeout)
+                search.on_result(candidate, reply is not None)
+                if self.debug:
+                    log.debug(f"Probe of {candidate} byte segments {'arrived' if reply is not None else 'lost'}")
+            size = search.confirmed
+
+        if size != self.segment_size:
+            self.segment_size = size
+            self.controller.set_mss(size)
+            self.scoreboard = SackScoreboard(size)
+        self.handshake_time = time.monotonic() - start
+        if self.debug:
+            log.debug(f"Segment size {size} after {self.handshake_time:.3f} s of handshake")
+
+    def _control(self, payload, expected, selector, attempts, timeout=None):
+        """send a control packet until a reply passes expected, returns (reply body, rtt) or (None, None).
+
+        Without a timeout every attempt waits one rto, backed off like the closing handshake.
+        """
+        packet = self.header.pack(0, control=True) + payload
+        for _ in range(attempts):
+            sent_at = time.monotonic()
+            try:
+                self.udp_socket.sendto(packet, self.receiver)
+            except OSError as e:
+                if e.errno == errno.EMSGSIZE:
+                    return None, None  # bigger than the interface takes
+                raise
+            deadline = sent_at + (timeout if timeout is not None else self.rto_timer.rto)
+            while True:
+                wait = deadline - time.monotonic()
+                if wait <= 0 or not selector.select(wait):
+                    break
+                reply = self._read_control()
+                if reply is not None and expected(reply):
+                    return reply, time.monotonic() - sent_at
+            if timeout is None:
+                self.rto_timer.backoff()
+        return None, None
+
+    def _read_control(self):
+        """the body of the next control reply waiting, None if there is none."""
+        while True:
+            try:
+                reply, _ = self.udp_socket.recvfrom(PACKET_SIZE)
+            except BlockingIOError:
+                return None
+            _, control, _, offset = self.header.parse(reply)
+            if control:
+                return reply[offset:]
+
+    def _close(self, selector):
+        """send the empty segment, wait for the receiver's fin and answer with ==FINACK==."""
+        fin = self.header.pack(self.source.length)
+        for _ in range(FIN_RETRIES):
+            self.udp_socket.sendto(fin, self.receiver)
+            if self._wait_for_fin(selector, time.monotonic() + self.rto_timer.rto):
+                break
+            self.rto_timer.backoff()
+        else:
+            log.warning("Receiver never acknowledged the end of the transfer")
+            return
+
+        finack = fin + b'==FINACK=='
+        self.udp_socket.sendto(finack, self.receiver)
+        # linger for one rto in case the finack got lost and the receiver repeats its fin
+        while self._wait_for_fin(selector, time.monotonic() + self.rto_timer.rto):
+            self.udp_socket.sendto(finack, self.receiver)
+
+    def _wait_for_fin(self, selector, deadline):
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or not selector.select(timeout):
+                return False
+            while True:
+                try:
+                    ack, _ = self.udp_socket.recvfrom(PACKET_SIZE)
+                except BlockingIOError:
+                    break
+                if ack[self.header.parse(ack)[3]:] == b'fin':
+                    return True
@@ -0,0 +1,167 @@
+"""Selective acknowledgements (in the spirit of RFC 2018) on top of the stock ack.
+
+The stock ack is a 4-byte cumulative ack id followed by b'ack'. A SACK ack
+keeps exactly that prefix and appends up to N (start, end) byte ranges the
+receiver holds beyond the cumulative ack, each packed as two signed 4-byte
+big-endian ints. Senders that only read the first 4 bytes keep working.
+
+A receiver that advertises its window puts RWND_TAG and the free buffer
+space as an unsigned 4-byte int right after b'ack', before any blocks.
+Blocks are 8 bytes each, so the 5 extra bytes tell the two layouts apart.
+Acks in the wide header (see header.py) use 16-byte blocks of unsigned
+8-byte offsets instead, the same rule holds.
+"""
+import bisect
+import itertools
+import struct
+
+from rangeset import RangeSet
+
+# one (start, end) block, end is exclusive
+SACK_BLOCK = struct.Struct('>ii')
+# body of every ack, stock or sack
+ACK_TAG = b'ack'
+# advertised receive window, in bytes
+RWND_TAG = b'w'
+RWND = struct.Struct('>I')
+RWND_SIZE = len(RWND_TAG) + RWND.size
+# a segment is presumed lost once this many segments above it were sacked
+DUP_THRESH = 3
+
+
+def encode_sack_blocks(blocks, block=SACK_BLOCK):
+    """pack (start, end) ranges for the ack body, block is the wide header's 8-byte pair for wide acks."""
+    return b''.join(block.pack(start, end) for start, end in blocks)
+
+
+def encode_rwnd(rwnd):
+    """the window field, goes right after ACK_TAG."""
+    return RWND_TAG + RWND.pack(rwnd)
+
+
+def _has_rwnd(body, block=SACK_BLOCK):
+    return (body.startswith(ACK_TAG + RWND_TAG)
+            and (len(body) - len(ACK_TAG)) % block.size == RWND_SIZE)
+
+
+def decode_rwnd(body, block=SACK_BLOCK):
+    """advertised window from an ack body, None if the receiver didn't send one."""
+    if not _has_rwnd(body, block):
+        return None
+    return RWND.unpack_from(body, len(ACK_TAG) + len(RWND_TAG))[0]
+
+
+def decode_sack_blocks(body, block=SACK_BLOCK):
+    """unpack the ranges from an ack body, [] for a stock ack."""
+    if not body.startswith(ACK_TAG):
+        return []
+    raw = body[len(ACK_TAG) + (RWND_SIZE if _has_rwnd(body, block) else 0):]
+    if len(raw) % block.size:
+        return []
+    return [block.unpack_from(raw, offset) for offset in range(0, len(raw), block.size)]
+
+
+def out_of_order_blocks(ranges, latest_seq_id, max_blocks):
+    """pick at most max_blocks of the ranges held above the cumulative ack.
+
+    ranges is the receiver's RangeSet, already merged and sorted. The block
+    holding latest_seq_id is reported first so the sender always learns
+    about the newest arrival, the rest follow in order.
+    """
+    latest = ranges.containing(latest_seq_id)
+    blocks = [latest] if latest is not None else []
+    for block in itertools.islice(ranges, max_blocks):
+        if len(blocks) == max_blocks:
+            break
+        if block != latest:
+            blocks.append(block)
+    return blocks
+
+
+class SackScoreboard:
+    """Sender-side record of which segments above the cumulative ack arrived.
+
+    Kept up to date as acks arrive instead of rebuilt from them. The sacked
+    bytes are a RangeSet, so a block the receiver repeats on every ack costs
+    a lookup. A segment is presumed lost once DUP_THRESH segments above it
+    were sacked, that is once it lies below the DUP_THRESH-th highest sacked
+    segment; that boundary only moves up, so holes() only looks at the
+    segments it passed since the last call.
+    """
+
+    def __init__(self, message_size):
+        self.message_size = message_size
+        self.sacked = RangeSet()  # bytes the receiver reported, above the cumulative ack
+        self.resent = set()  # holes already retransmitted from the scoreboard
+        self.highest = []  # the DUP_THRESH highest sacked seq ids, ascending
+        self.scanned = 0  # holes() has looked at every segment below this
+        self.ack_id = 0
+
+    def update(self, ack_id, blocks):
+        """apply one ack, returns the seq ids that were sacked for the first time."""
+        if ack_id > self.ack_id:
+            if self.resent:
+                for seq_id in range(self._segment_at(self.ack_id), ack_id, self.message_size):
+                    self.resent.discard(seq_id)
+            self.ack_id = ack_id
+            self.sacked.discard_below(ack_id)
+            self.highest = [seq_id for seq_id in self.highest if seq_id >= ack_id]
+
+        newly_sacked = []
+        for start, end in blocks:
+            # blocks start and end on segment boundaries, so every segment starting inside one arrived
+            first = self._segment_at(max(start, self.ack_id))
+            seq_id = first
+            while seq_id < end:
+                held = self.sacked.containing(seq_id)
+                if held is not None:
+                    seq_id = self._segment_at(held[1])  # reported by an earlier ack
+                    continue
+                newly_sacked.append(seq_id)
+                self._rank(seq_id)
+                seq_id += self.message_size
+            self.sacked.add(first, end)
+        return newly_sacked
+
+    def mark_resent(self, seq_id):
+        """record a retransmission made outside holes(), False if it was already resent."""
+        if seq_id in self.resent:
+            return False
+        self.resent.add(seq_id)
+        return True
+
+    def is_sacked(self, seq_id):
+        return self.sacked.containing(seq_id) is not None
+
+    def holes(self):
+        """segments presumed lost that haven't been resent yet, marks them resent.
+
+        A hole only counts as lost once DUP_THRESH segments above it were
+        sacked, so mild reordering doesn't trigger a retransmission.
+        """
+        if len(self.highest) < DUP_THRESH:
+            return []
+        boundary = self.highest[0]
+        lost = []
+        seq_id = self._segment_at(max(self.scanned, self.ack_id))
+        while seq_id < boundary:
+            held = self.sacked.containing(seq_id)
+            if held is not None:
+                seq_id = self._segment_at(held[1])
+                continue
+            if seq_id not in self.resent:
+                lost.append(seq_id)
+            seq_id += self.message_size
+        self.scanned = max(self.scanned, boundary)
+        self.resent.update(lost)
+        return lost
+
+    def _segment_at(self, offset):
+        """the first segment boundary at or after offset."""
+        return offset + -offset % self.message_size
+
+    def _rank(self, seq_id):
+        """keep seq_id if it's among the DUP_THRESH highest sacked."""
+        if len(self.highest) < DUP_THRESH or seq_id > self.highest[0]:
+            bisect.insort(self.highest, seq_id)
+            del self.highest[:-DUP_THRESH]
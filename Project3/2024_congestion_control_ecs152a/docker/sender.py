@@ -0,0 +1,109 @@
+import argparse
+import logging
+
+from acktrace import open_tracer
+from bbr import BBR, BBRPacer
+from congestion import Cubic, FixedWindow, NewReno, Tahoe, Vegas
+from fec import MAX_PARITY, FecEncoder
+from pacing import DEFAULT_GAIN, Pacer
+from metrics import print_report
+from runtime import LOG_LEVELS, SenderRuntime
+from source import open_source
+
+PACKET_SIZE = 1024
+SEQ_ID_SIZE = 4
+MESSAGE_SIZE = PACKET_SIZE - SEQ_ID_SIZE
+WINDOW_SIZE = 100
+
+# every algorithm runs on the same send loop, only the engine differs
+ALGORITHMS = {
+    "fixed": lambda: FixedWindow(MESSAGE_SIZE, WINDOW_SIZE),
+    "tahoe": lambda: Tahoe(MESSAGE_SIZE, ssthresh=1000 * MESSAGE_SIZE),
+    "reno": lambda: NewReno(MESSAGE_SIZE, ssthresh=1000 * MESSAGE_SIZE),
+    "cubic": lambda: Cubic(MESSAGE_SIZE),
+    "vegas": lambda: Vegas(MESSAGE_SIZE),
+    "bbr": lambda: BBR(MESSAGE_SIZE),
+}
+
+def main(path='file.mp3', algorithm="reno", selective_repeat=False, sack=False, pacing_gain=None, pacing_trace=None,
+         conn_id=None, local_port=5002, batch=None, segment_size=None, probe_mtu=False, wide=False, fec_block=None, fec_parity=None, trace=None):
+    controller = ALGORITHMS[algorithm]()
+    # asking for a segment size or probing for one starts with a handshake, otherwise the stock segment is used
+    handshake = segment_size is not None or probe_mtu
+    segment_size = segment_size or MESSAGE_SIZE
+    controller.set_mss(segment_size)
+    # bbr always paces at its model's rate, the others only when asked to
+    if isinstance(controller, BBR):
+        pacer = BBRPacer(controller, trace=pacing_trace is not None)
+    elif pacing_gain:
+        pacer = Pacer(pacing_gain, trace=pacing_trace is not None)
+    else:
+        pacer = None
+
+    # parity packets after every fec_block new segments, as many as the measured loss calls for unless fixed
+    fec = FecEncoder(fec_block, fec_parity) if fec_block else None
+
+    # map the file (or stream it, for pipes and stdin) instead of reading it all into memory
+    with open_source(path, segment_size) as data, open_tracer(trace) as tracer:
+        runtime = SenderRuntime(data, controller, selective_repeat=selective_repeat, sack=sack, pacer=pacer,
+                                bind=('localhost', local_port), conn_id=conn_id, batch=batch,
+                                segment_size=segment_size, handshake=handshake, probe_mtu=probe_mtu,
+                                wide=wide, fec=fec, tracer=tracer)
+        runtime.run()
+    if pacing_trace is not None and pacer is not None:
+        pacer.write_trace(pacing_trace)
+
+    print(f"Algorithm: {algorithm}")
+    print_report(runtime)
+    if runtime.handshake_time is not None:
+        print(f"Segment size: {runtime.segment_size} (handshake {round(runtime.handshake_time, 7)} s)")
+    if runtime.io is not None:
+        print(runtime.io.summary())
+    if fec is not None:
+        print(f"{fec.summary()}, {runtime.parity_bytes} parity bytes")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sender with a selectable congestion control algorithm")
+    parser.add_argument("--cc", choices=sorted(ALGORITHMS), default="reno",
+                        help="congestion control algorithm (default %(default)s)")
+    parser.add_argument("--selective-repeat", action="store_true",
+                        help="resend only segments whose own timer expired instead of the whole window")
+    parser.add_argument("--sack", action="store_true",
+                        help="use the receiver's SACK blocks to resend only the holes (implies --selective-repeat)")
+    parser.add_argument("--pacing", action="store_true",
+                        help="pace packets at gain * cwnd / srtt instead of sending the window as a burst (bbr always paces)")
+    parser.add_argument("--pacing-gain", type=float, default=DEFAULT_GAIN, metavar="G",
+                        help="pacing rate multiplier over cwnd / srtt (default %(default)s)")
+    parser.add_argument("--pacing-trace", metavar="FILE",
+                        help="write the pacing rate over time to FILE as csv")
+    parser.add_argument("--conn-id", type=int, metavar="ID",
+                        help="put a connection id in every header, for a receiver run with --conn-id")
+    parser.add_argument("--local-port", type=int, default=5002,
+                        help="port to send from, 0 picks a free one (default %(default)s)")
+    parser.add_argument("--batch", type=int, metavar="N",
+                        help="send and receive up to N datagrams per system call with sendmmsg/recvmmsg")
+    parser.add_argument("--segment-size", type=int, metavar="BYTES",
+                        help=f"payload bytes per segment, agreed with the receiver in a handshake (default {MESSAGE_SIZE})")
+    parser.add_argument("--probe-mtu", action="store_true",
+                        help="after the handshake, probe for the largest segment the path carries whole")
+    parser.add_argument("--wide", action="store_true",
+                        help="use the versioned header with a 64-bit offset, needed past 2 GiB")
+    parser.add_argument("--fec", type=int, metavar="N",
+                        help="send parity after every N new segments so the receiver can rebuild losses itself")
+    parser.add_argument("--fec-parity", type=int, metavar="K",
+                        help=f"parity packets per block, by default 1 to {MAX_PARITY} following the measured loss")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="warning",
+                        help="debug logs every packet, ack and state change (default %(default)s)")
+    parser.add_argument("-v", "--verbose", action="store_const", dest="log_level", const="debug",
+                        help="same as --log-level debug")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record every ack, retransmit and timeout to FILE (see acktrace.py)")
+    parser.add_argument("--file", default="file.mp3",
+                        help="file to send, '-' reads stdin (default %(default)s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    main(path=args.file, algorithm=args.cc, selective_repeat=args.selective_repeat or args.sack, sack=args.sack,
+         pacing_gain=args.pacing_gain if args.pacing else None, pacing_trace=args.pacing_trace,
+         conn_id=args.conn_id, local_port=args.local_port, batch=args.batch,
+         segment_size=args.segment_size, probe_mtu=args.probe_mtu, wide=args.wide,
+         fec_block=args.fec, fec_parity=args.fec_parity, trace=args.trace)
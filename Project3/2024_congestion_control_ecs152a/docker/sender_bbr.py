@@ -0,0 +1,47 @@
+import argparse
+import logging
+
+from acktrace import open_tracer
+from bbr import BBR, BBRPacer
+from metrics import print_report
+from runtime import LOG_LEVELS, SenderRuntime
+from source import open_source
+
+PACKET_SIZE = 1024
+SEQ_ID_SIZE = 4
+MESSAGE_SIZE = PACKET_SIZE - SEQ_ID_SIZE
+
+def main(path='file.mp3', selective_repeat=False, sack=False, pacing_trace=None, wide=False, trace=None):
+    # bottleneck bandwidth and min rtt from the ack stream set the pacing rate and the window, loss doesn't
+    bbr = BBR(MESSAGE_SIZE)
+    pacer = BBRPacer(bbr, trace=pacing_trace is not None)
+
+    # map the file (or stream it, for pipes and stdin) instead of reading it all into memory
+    with open_source(path, MESSAGE_SIZE) as data, open_tracer(trace) as tracer:
+        runtime = SenderRuntime(data, bbr, selective_repeat=selective_repeat, sack=sack, pacer=pacer, wide=wide, tracer=tracer)
+        runtime.run()
+    if pacing_trace is not None:
+        pacer.write_trace(pacing_trace)
+
+    print_report(runtime)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BBR sender")
+    parser.add_argument("--selective-repeat", action="store_true",
+                        help="resend only segments whose own timer expired instead of the whole window")
+    parser.add_argument("--sack", action="store_true",
+                        help="use the receiver's SACK blocks to resend only the holes (implies --selective-repeat)")
+    parser.add_argument("--pacing-trace", metavar="FILE",
+                        help="write the pacing rate over time to FILE as csv")
+    parser.add_argument("--wide", action="store_true",
+                        help="use the versioned header with a 64-bit offset, needed past 2 GiB")
+    parser.add_argument("--file", default="file.mp3",
+                        help="file to send, '-' reads stdin (default %(default)s)")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="warning",
+                        help="debug logs every packet, ack and state change (default %(default)s)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record every ack, retransmit and timeout to FILE (see acktrace.py)")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    main(path=args.file, selective_repeat=args.selective_repeat or args.sack, sack=args.sack, pacing_trace=args.pacing_trace,
+         wide=args.wide, trace=args.trace)
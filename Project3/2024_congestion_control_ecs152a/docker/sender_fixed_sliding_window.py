@@ -1,5 +1,12 @@
-import socket
-import time
+import argparse
+import logging
+
+from acktrace import open_tracer
+from congestion import FixedWindow
+from pacing import DEFAULT_GAIN, Pacer
+from metrics import print_report
+from runtime import LOG_LEVELS, SenderRuntime
+from source import open_source
 
 # total packet size
 PACKET_SIZE = 1024  
@@ -10,92 +17,49 @@ MESSAGE_SIZE = PACKET_SIZE - SEQ_ID_SIZE
 # total packets to send
 WINDOW_SIZE = 100
 
-def main():
-    
-    #lists
-    packet_delays = []  # total per-packet delays
-    jitters = []
-    send_times = {}  # Dictionary to store send times for each packet
-    
-    # Read data
-    with open('file.mp3', 'rb') as f:
-        data = f.read()
-
-    total_bytes = 0  # Track total data sent
-
-    # Create a UDP socket
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
-
-        # Bind the socket to a local port
-        udp_socket.bind(("localhost", 5002))  
-        udp_socket.settimeout(1)  
-
-        # Timing for throughput
-        start_time = time.time()  
-
-        # Sliding window variables
-        # messages = []
-        base_id = 0  # First unacknowledged sequence ID
-        seq_id_tmp = 0  # Next sequence ID to send
-        acks = {}  # Acknowledgments for each packet
-        acked = []
-
-        while base_id < len(data):
-            # Fill the window with packets up to the window size
-            while seq_id_tmp < base_id + WINDOW_SIZE * MESSAGE_SIZE and seq_id_tmp < len(data):
-                # Prepare the packet
-                message = int.to_bytes(seq_id_tmp, SEQ_ID_SIZE, byteorder='big', signed=True) + data[seq_id_tmp: seq_id_tmp + MESSAGE_SIZE]
-                # messages.append((seq_id_tmp, message))                
-                udp_socket.sendto(message, ('localhost', 5001))
-
-                if seq_id_tmp not in send_times: 
-                    send_times[seq_id_tmp] = time.time()  # Store the send time for this packet
-                total_bytes += len(message)  # Track bytes sent
-                acks[seq_id_tmp] = False
-
-                seq_id_tmp += MESSAGE_SIZE
-
-            # Wait for acknowledgment of the packets in the window
-            try:
-                while True:
-                    ack, _ = udp_socket.recvfrom(PACKET_SIZE)
-                    ack_id = int.from_bytes(ack[:SEQ_ID_SIZE], byteorder='big')
-                    # Calculate delay for the acknowledged packet
-                    if ack_id in send_times:
-                        end_send = time.time()  # Timestamp when the acknowledgment is received
-                        packet_delay = end_send - send_times[ack_id]
-                        packet_delays.append(packet_delay)  # Store the delay
-
-                    if ack_id >= base_id:
-                        if ack_id in acks and not acks[ack_id]:
-                            acks[ack_id] = True
-                            base_id = ack_id + MESSAGE_SIZE
-
-            except socket.timeout:
-                seq_id_tmp = base_id
-                continue
-
-        # Send closing message
-        udp_socket.sendto(int.to_bytes(-1, SEQ_ID_SIZE, byteorder='big', signed=True), ('localhost', 5001))
-
-        end_time = time.time()  # End timing for throughput
+def main(path='file.mp3', selective_repeat=False, sack=False, pacing_gain=None, pacing_trace=None, batch=None, wide=False, trace=None):
 
-    #calculate jitters
-    for i in range(len(packet_delays) - 1):
-        jitter = abs(packet_delays[i + 1] - packet_delays[i])
-        jitters.append(jitter)
-        
-    #calculate metrics
-    throughput = (total_bytes) / (end_time - start_time)  # bits per second
-    avg_jitter = sum(jitters) / len(jitters) if jitters else 0
-    avg_delay = sum(packet_delays) / len(packet_delays) if packet_delays else 0
+    # optional pacing spreads the window over one rtt instead of bursting it
+    pacer = Pacer(pacing_gain, trace=pacing_trace is not None) if pacing_gain else None
 
-    metric = 0.2 * (throughput / 2000) + (0.1 / avg_jitter) + (0.8 / avg_delay)
+    # map the file (or stream it, for pipes and stdin) instead of reading it all into memory
+    with open_source(path, MESSAGE_SIZE) as data, open_tracer(trace) as tracer:
+        # the window never changes, acks and timers are handled by the event loop
+        runtime = SenderRuntime(data, FixedWindow(MESSAGE_SIZE, WINDOW_SIZE),
+                                selective_repeat=selective_repeat, sack=sack, pacer=pacer, batch=batch, wide=wide,
+                                tracer=tracer)
+        runtime.run()
+    if pacing_trace is not None and pacer is not None:
+        pacer.write_trace(pacing_trace)
 
-    print(f"Throughput (bps): {round(throughput, 7)}")
-    print(f"Avg Packet Delay (s): {round(avg_delay, 7)}")
-    print(f"Avg Jitter (s): {round(avg_jitter, 7)}")
-    print(f"Metric: {round(metric, 7)}")
+    print_report(runtime)
+    if runtime.io is not None:
+        print(runtime.io.summary())
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="fixed sliding window sender")
+    parser.add_argument("--selective-repeat", action="store_true",
+                        help="resend only segments whose own timer expired instead of the whole window")
+    parser.add_argument("--sack", action="store_true",
+                        help="use the receiver's SACK blocks to resend only the holes (implies --selective-repeat)")
+    parser.add_argument("--pacing", action="store_true",
+                        help="pace packets at gain * cwnd / srtt instead of sending the window as a burst")
+    parser.add_argument("--pacing-gain", type=float, default=DEFAULT_GAIN, metavar="G",
+                        help="pacing rate multiplier over cwnd / srtt (default %(default)s)")
+    parser.add_argument("--pacing-trace", metavar="FILE",
+                        help="write the pacing rate over time to FILE as csv")
+    parser.add_argument("--batch", type=int, metavar="N",
+                        help="send the window and drain acks up to N datagrams per system call with sendmmsg/recvmmsg")
+    parser.add_argument("--wide", action="store_true",
+                        help="use the versioned header with a 64-bit offset, needed past 2 GiB")
+    parser.add_argument("--file", default="file.mp3",
+                        help="file to send, '-' reads stdin (default %(default)s)")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="warning",
+                        help="debug logs every packet, ack and state change (default %(default)s)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record every ack, retransmit and timeout to FILE (see acktrace.py)")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    main(path=args.file, selective_repeat=args.selective_repeat or args.sack, sack=args.sack,
+         pacing_gain=args.pacing_gain if args.pacing else None, pacing_trace=args.pacing_trace,
+         batch=args.batch, wide=args.wide, trace=args.trace)
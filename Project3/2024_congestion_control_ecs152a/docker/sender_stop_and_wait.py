@@ -1,5 +1,11 @@
-import socket
-import time
+import argparse
+import logging
+
+from acktrace import open_tracer
+from congestion import FixedWindow
+from metrics import print_report
+from runtime import LOG_LEVELS, SenderRuntime
+from source import open_source
 
 # Constants
 # total packet size
@@ -8,108 +14,28 @@ PACKET_SIZE = 1024
 SEQ_ID_SIZE = 4
 # bytes available for message
 MESSAGE_SIZE = PACKET_SIZE - SEQ_ID_SIZE
-# total packets to send
-#WINDOW_SIZE = 1
 
-def main():
+def main(path='file.mp3', wide=False, trace=None):
 
-    # Metrics tracking
-    packet_delays = []  # List of per-packet delays
-    jitter_values = []  # List of jitter values (difference between successive delays)
-    total_bytes_sent = 0  # Total bytes successfully sent and acknowledged
-    start_time = None  # Start time for throughput calculation
-    
-    # Read data
-    with open('file.mp3', 'rb') as f:
-        data = f.read()
-    
-    # Create a UDP socket
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
-    
-        # Bind the socket to an OS port
-        udp_socket.bind(("0.0.0.0", 5002))
-        udp_socket.settimeout(1)
-    
-        # Start sending data from the 0th sequence
-        seq_id = 0
-        start_time = time.time()  # Start throughput timer
-    
-        while seq_id < len(data):
-            # Create messages
-            #messages = []
-            #acks = {}
-            seq_id_tmp = seq_id
+    # map the file (or stream it, for pipes and stdin) instead of reading it all into memory
+    with open_source(path, MESSAGE_SIZE) as data, open_tracer(trace) as tracer:
+        # A window of a single packet: send, wait for its acknowledgment (or timeout and resend), repeat
+        runtime = SenderRuntime(data, FixedWindow(MESSAGE_SIZE, 1), bind=("0.0.0.0", 5002), wide=wide, tracer=tracer)
+        runtime.run()
 
-            # Construct messages
-            message = int.to_bytes(seq_id_tmp, SEQ_ID_SIZE, byteorder='big', signed=True) + data[seq_id_tmp: seq_id_tmp + MESSAGE_SIZE]
-            #messages.append((seq_id_tmp, message))
-            #acks[seq_id_tmp] = False
-            acks = False
-            seq_id_tmp += MESSAGE_SIZE
-    
-            # Send messages and track send times
-            #send_times = {}  # To track when each message is sent
-            udp_socket.sendto(message, ('localhost', 5001))
-            send_times = time.time()  # Log send time
-    
-            # Wait for acknowledgment
-            while True:
-                try:
-                    ack, _ = udp_socket.recvfrom(PACKET_SIZE)
-                    ack_id = int.from_bytes(ack[:SEQ_ID_SIZE], byteorder='big')
-                    print(ack_id, ack[SEQ_ID_SIZE:])  # Preserve the print statement for each acknowledgment
-    
-                    # Mark all sequence IDs up to the ack_id as acknowledged
-                    #for sid in list(acks.keys()):
-                        #if sid <= ack_id:
-                            #acks[sid] = True
-                    acks = True
-    
-                    # Measure delay for this packet
-                    #if ack_id in send_times:
-                    delay = time.time() - send_times
-                    packet_delays.append(delay)
-    
-                        # Calculate jitter (difference from the previous delay)
-                    if len(packet_delays) > 1:
-                        jitter = abs(packet_delays[-1] - packet_delays[-2])
-                        jitter_values.append(jitter)
-    
-                    # All acks received, move on
-                    if acks:
-                        break
-                except socket.timeout:
-                    # Resend unacknowledged messages
-                    if not acks:
-                        udp_socket.sendto(message, ('localhost', 5001))
-                        send_times = time.time()  # Update resend time
-    
-            # Update the sequence ID and total bytes sent
-            seq_id += MESSAGE_SIZE
-            total_bytes_sent += MESSAGE_SIZE
-    
-        # Send final closing message
-        udp_socket.sendto(int.to_bytes(-1, 4, signed=True, byteorder='big'), ('localhost', 5001))
-    
-    # Final Metrics Calculation
-    end_time = time.time()
-    total_time = end_time - start_time  # Total time taken for transmission
-    throughput = total_bytes_sent / total_time if total_time > 0 else 0
-    average_delay = sum(packet_delays) / len(packet_delays) if packet_delays else 0
-    average_jitter = sum(jitter_values) / len(jitter_values) if jitter_values else 0
-    
-    # Performance Metric
-    performance_metric = (
-        0.2 * (throughput / 2000) +
-        0.1 / (average_jitter if average_jitter > 0 else 1) +
-        0.8 / (average_delay if average_delay > 0 else 1)
-    )
-    
-    # Print Metrics
-    print(f"Throughput: {throughput:.7f} bytes/second")
-    print(f"Average Packet Delay: {average_delay:.7f} seconds")
-    print(f"Average Jitter: {average_jitter:.7f} seconds")
-    print(f"Performance Metric: {performance_metric:.7f}")
+    # the same metrics, from the same streaming estimators, as every other sender
+    print_report(runtime)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="stop and wait sender")
+    parser.add_argument("--wide", action="store_true",
+                        help="use the versioned header with a 64-bit offset, needed past 2 GiB")
+    parser.add_argument("--file", default="file.mp3",
+                        help="file to send, '-' reads stdin (default %(default)s)")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="warning",
+                        help="debug logs every packet, ack and state change (default %(default)s)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record every ack, retransmit and timeout to FILE (see acktrace.py)")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    main(path=args.file, wide=args.wide, trace=args.trace)
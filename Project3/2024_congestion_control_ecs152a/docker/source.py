@@ -0,0 +1,189 @@
+"""Where the sender's payload comes from, without reading the whole file into memory.
+
+A SegmentSource hands out zero-copy views of the payload by sequence id
+(byte offset) and is told when a prefix has been acknowledged, so it can
+let go of the memory behind it:
+
+- MmapSource maps a regular file; acked pages are dropped with madvise.
+- StreamSource reads any file-like object (a pipe, stdin) in chunks as the
+  window advances and frees chunks once they are acked.
+- BytesSource wraps data that is already in memory.
+- RangeSource is one byte range of another source, numbered from 0, for
+  striping a file across parallel flows.
+
+Sequence ids are multiples of the segment size, so a segment never
+straddles a StreamSource chunk as long as the chunk size is a multiple of
+it. When the segment size changes after the chunks were cut (a handshake
+or mtu probe settling on another size), a segment that runs past a chunk
+end is stitched together with a copy, once per chunk.
+"""
+import collections
+import mmap
+import os
+import stat
+import sys
+
+# acked bytes to collect before returning them to the os, so it isn't a syscall per ack
+RELEASE_BYTES = 1 << 20
+# chunks read at a time by StreamSource, in segments
+CHUNK_SEGMENTS = 1024
+
+
+class SegmentSource:
+    """Payload by byte offset. length is None until the end has been seen."""
+
+    length = None
+
+    def has(self, offset):
+        """True if there is payload at offset, reading ahead if needed."""
+        raise NotImplementedError
+
+    def segment(self, offset, size):
+        """view of up to size bytes starting at offset."""
+        raise NotImplementedError
+
+    def release(self, offset):
+        """everything before offset was acknowledged and won't be asked for again."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BytesSource(SegmentSource):
+    """Payload already in memory."""
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.length = len(data)
+
+    def has(self, offset):
+        return offset < self.length
+
+    def segment(self, offset, size):
+        return self.view[offset: offset + size]
+
+    def close(self):
+        self.view.release()
+
+
+class MmapSource(SegmentSource):
+    """A regular file mapped read-only; the os pages it in as segments are sent."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.length = len(self.map)
+        self.released = 0  # pages before this offset were handed back
+
+    def has(self, offset):
+        return offset < self.length
+
+    def segment(self, offset, size):
+        return self.view[offset: offset + size]
+
+    def release(self, offset):
+        end = offset - offset % mmap.PAGESIZE
+        if end - self.released < RELEASE_BYTES or not hasattr(self.map, 'madvise'):
+            return
+        # clean file-backed pages, dropping them costs nothing but a re-read if touched again
+        self.map.madvise(mmap.MADV_DONTNEED, self.released, end - self.released)
+        self.released = end
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+
+class StreamSource(SegmentSource):
+    """Reads a file-like object front to back in chunks, holding only the unacked ones."""
+
+    def __init__(self, stream, segment_size, chunk_segments=CHUNK_SEGMENTS):
+        self.stream = stream
+        self.chunk_size = segment_size * chunk_segments
+        self.chunks = collections.deque()  # (offset, view), contiguous and in order
+        self.read_to = 0  # end of the last chunk read
+
+    def has(self, offset):
+        while offset >= self.read_to and self.length is None:
+            self._read_chunk()
+        return offset < self.read_to
+
+    def segment(self, offset, size):
+        if not self.has(offset):
+            return memoryview(b'')
+        piece = self._tail(offset)[:size]
+        if len(piece) == size or not self.has(offset + len(piece)):
+            return piece
+        # the segment runs past the chunk end, copy it together from the chunks it spans
+        stitched = bytearray(piece)
+        while len(stitched) < size and self.has(offset + len(stitched)):
+            stitched += self._tail(offset + len(stitched))[:size - len(stitched)]
+        return memoryview(stitched)
+
+    def _tail(self, offset):
+        """view from offset to the end of the chunk holding it."""
+        for start, view in self.chunks:
+            if start <= offset < start + len(view):
+                return view[offset - start:]
+        raise ValueError(f"offset {offset} was already released")
+
+    def release(self, offset):
+        chunks = self.chunks
+        while chunks and chunks[0][0] + len(chunks[0][1]) <= offset:
+            chunks.popleft()
+
+    def close(self):
+        self.chunks.clear()
+        self.stream.close()
+
+    def _read_chunk(self):
+        chunk = bytearray(self.chunk_size)
+        filled = 0
+        # pipes return short reads, keep going until the chunk is full or the stream ends
+        while filled < self.chunk_size:
+            n = self.stream.readinto(memoryview(chunk)[filled:])
+            if not n:
+                self.length = self.read_to + filled
+                break
+            filled += n
+        if filled:
+            self.chunks.append((self.read_to, memoryview(chunk)[:filled]))
+            self.read_to += filled
+
+
+class RangeSource(SegmentSource):
+    """Bytes start to end of another source, with offsets counted from start.
+
+    Several ranges share one underlying source, so release is left to
+    whoever owns it.
+    """
+
+    def __init__(self, source, start, end):
+        self.source = source
+        self.start = start
+        self.length = end - start
+
+    def has(self, offset):
+        return offset < self.length and self.source.has(self.start + offset)
+
+    def segment(self, offset, size):
+        return self.source.segment(self.start + offset, min(size, self.length - offset))
+
+
+def open_source(path, segment_size):
+    """mmap a regular file, stream anything else; '-' streams stdin."""
+    if path == '-':
+        return StreamSource(sys.stdin.buffer, segment_size)
+    st = os.stat(path)
+    if not stat.S_ISREG(st.st_mode):
+        return StreamSource(open(path, 'rb', buffering=0), segment_size)
+    if st.st_size == 0:
+        return BytesSource(b'')  # empty files can't be mapped
+    return MmapSource(path)
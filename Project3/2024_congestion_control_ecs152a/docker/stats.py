@@ -0,0 +1,136 @@
+"""Live receiver counters in Prometheus' text exposition format.
+
+The receive loop only bumps plain integers: ReceiverStats counts every
+datagram and its bytes, and each connection keeps its own counts in its
+reassembler (duplicates, out-of-order arrivals, buffer overflows) and ack
+policy (acks sent). Nothing is formatted until something asks: a daemon
+thread serves the numbers over HTTP, on a local TCP port or a UNIX
+socket, and builds the text from the connection table when a request
+comes in.
+
+The totals are the live connections' counts plus those of every
+connection that has closed, folded in by retire(). The table changes
+under the stats thread, so closing a connection and folding it in happen
+under one lock, which a scrape also takes; a counter never goes back.
+
+    python3 receiver.py --stats 9100
+    curl -s localhost:9100/metrics
+    python3 receiver.py --stats /tmp/receiver.sock
+    curl -s --unix-socket /tmp/receiver.sock http://localhost/metrics
+"""
+import http.server
+import os
+import socketserver
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# per-connection counts that add up to the receiver's totals: name -> (help, how to read it)
+CONNECTION_COUNTERS = {
+    'datagrams': ("datagrams of data and parity that arrived", lambda c: c.datagrams),
+    'duplicates': ("segments that brought nothing new", lambda c: c.reassembler.duplicates),
+    'out_of_order': ("segments that arrived ahead of a hole", lambda c: c.reassembler.out_of_order),
+    'buffer_overflows': ("segments dropped for want of buffer space", lambda c: c.reassembler.overflows),
+    'acks_sent': ("acks sent", lambda c: c.policy.acks_sent),
+}
+
+
+class ReceiverStats:
+    """The receiver's counters, read by the stats thread while the receive loop updates them."""
+
+    def __init__(self, table):
+        self.table = table
+        self.lock = threading.Lock()  # held while a connection closes, and while a scrape reads the table
+        self.started = time.monotonic()
+        self.datagrams = 0  # everything received, control packets and stragglers included
+        self.bytes = 0
+        self.retired = dict.fromkeys(CONNECTION_COUNTERS, 0)  # counts of connections already closed
+        self.closed = 0
+
+    def retire(self, connection):
+        """fold a connection the table just closed into the totals, call it holding lock."""
+        for name, (_, read) in CONNECTION_COUNTERS.items():
+            self.retired[name] += read(connection)
+        self.closed += 1
+
+    def exposition(self):
+        """every metric as Prometheus text."""
+        now = time.monotonic()
+        with self.lock:
+            connections = list(self.table.connections.values())
+            retired = dict(self.retired)
+            closed = self.closed
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append(f"# HELP receiver_{name} {help}")
+            lines.append(f"# TYPE receiver_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"receiver_{name}{labels} {value}")
+
+        metric('received_datagrams_total', 'counter', "datagrams received", [('', self.datagrams)])
+        metric('received_bytes_total', 'counter', "bytes received, headers included", [('', self.bytes)])
+        for name, (help, read) in CONNECTION_COUNTERS.items():
+            if name != 'datagrams':
+                metric(f'{name}_total', 'counter', help,
+                       [('', retired[name] + sum(read(c) for c in connections))])
+        metric('connections', 'gauge', "transfers in progress", [('', len(connections))])
+        metric('connections_closed_total', 'counter', "transfers finished or dropped as idle", [('', closed)])
+        metric('uptime_seconds', 'gauge', "seconds since the receiver started", [('', round(now - self.started, 3))])
+
+        labels = {c: _labels(c.key) for c in connections}
+        metric('expected_seq_id', 'gauge', "next byte expected, everything before it is written out",
+               [(labels[c], c.reassembler.expected) for c in connections])
+        metric('buffered_bytes', 'gauge', "out-of-order bytes held in the reassembly buffer",
+               [(labels[c], c.reassembler.buffered) for c in connections])
+        metric('goodput_bytes_per_second', 'gauge', "bytes written in order per second since the first packet",
+               [(labels[c], round(c.reassembler.expected / max(now - c.started, 1e-6), 3)) for c in connections])
+        for name, (help, read) in CONNECTION_COUNTERS.items():
+            metric(f'connection_{name}_total', 'counter', f"{help}, per transfer",
+                   [(labels[c], read(c)) for c in connections])
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(key):
+    (host, port), conn_id = key
+    return f'{{client="{host}:{port}",conn="{conn_id}"}}'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.stats.exposition().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # a scrape every few seconds shouldn't fill the receiver's output
+
+
+class _UnixHTTPServer(socketserver.UnixStreamServer):
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('unix', 0)  # the handler expects a (host, port) client address
+
+
+def serve_stats(stats, address):
+    """serve stats from a daemon thread, address is a port, host:port or a UNIX socket path; returns the server."""
+    if '/' in address:
+        if os.path.exists(address):
+            os.unlink(address)  # left behind by an earlier run
+        server = _UnixHTTPServer(address, _Handler)
+    else:
+        host, _, port = address.rpartition(':')
+        server = http.server.HTTPServer((host or '127.0.0.1', int(port)), _Handler)
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, name='stats', daemon=True).start()
+    return server
+
+
+def close_stats(server):
+    """stop taking requests, and remove a UNIX socket's file."""
+    server.server_close()
+    if isinstance(server, _UnixHTTPServer):
+        os.unlink(server.server_address)
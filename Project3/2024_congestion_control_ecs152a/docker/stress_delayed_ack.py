@@ -0,0 +1,161 @@
+"""Stress check for the receiver's delayed-ack timer under steady arrivals.
+
+Starts receiver.py --multi with a large --ack-every, so in-order segments
+are only acked when the --ack-delay timer fires, and keeps segments
+arriving faster than that delay. Every segment must be acked within the
+delay plus some slack for scheduling:
+
+* steady: one client sends a segment every --interval seconds;
+* other client: one client sends a single segment while a second one
+  keeps the receiver busy, and the quiet client's ack must not wait for
+  the busy one to stop.
+
+The default interval is below the receiver's shortest socket timeout, so
+the receive loop never sees an empty wakeup while segments keep coming.
+"""
+import argparse
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from header import StockHeader
+
+SEGMENT = 1020
+# segments acked together, far more than a run sends so only the timer acks
+ACK_EVERY = 1_000_000
+
+
+def start_receiver(port, ack_delay, out_dir):
+    receiver = subprocess.Popen([sys.executable, 'receiver.py', '--port', str(port), '--multi',
+                                 '--output', os.path.join(out_dir, 'out.bin'),
+                                 '--ack-every', str(ACK_EVERY), '--ack-delay', str(ack_delay)],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    assert receiver.stdout.readline().strip() == "Receiver running", "receiver didn't start"
+    return receiver
+
+
+class Client:
+    """Sends in-order segments and remembers when each one was first covered by an ack."""
+
+    def __init__(self, receiver):
+        self.receiver = receiver
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.setblocking(False)
+        self.header = StockHeader()
+        self.sent = []  # (seq_id, send time)
+        self.acked_at = {}  # seq_id -> when an ack first covered it
+        self.next_seq = 0
+
+    def send(self, now):
+        payload = bytes(SEGMENT)
+        self.sock.sendto(self.header.pack(self.next_seq) + payload, self.receiver)
+        self.sent.append((self.next_seq, now))
+        self.next_seq += SEGMENT
+
+    def read_acks(self, now):
+        while True:
+            try:
+                ack, _ = self.sock.recvfrom(2048)
+            except BlockingIOError:
+                return
+            ack_id = self.header.parse(ack)[0]
+            for seq_id, _ in self.sent:
+                if seq_id < ack_id:
+                    self.acked_at.setdefault(seq_id, now)
+
+    def longest_wait(self):
+        """the longest any segment waited for its ack, None if one never got acked."""
+        waits = [self.acked_at[seq_id] - sent if seq_id in self.acked_at else None for seq_id, sent in self.sent]
+        return None if None in waits else max(waits)
+
+
+def pump(clients, schedule, until, tick):
+    """send on schedule(now) -> clients to send to, read acks, until the deadline."""
+    while True:
+        now = time.monotonic()
+        if now >= until:
+            return
+        for client in schedule(now):
+            client.send(now)
+        readable, _, _ = select.select([c.sock for c in clients], [], [], tick)
+        now = time.monotonic()
+        for client in clients:
+            if client.sock in readable:
+                client.read_acks(now)
+
+
+def steady(port, interval, ack_delay, duration):
+    busy = Client(('127.0.0.1', port))
+    next_send = [time.monotonic()]
+
+    def schedule(now):
+        due = []
+        while now >= next_send[0]:
+            next_send[0] += interval
+            due.append(busy)
+        return due
+
+    end = time.monotonic() + duration
+    pump([busy], schedule, end, interval)
+    pump([busy], lambda now: [], end + 2 * ack_delay, interval)  # the last segment's timer
+    return busy.longest_wait()
+
+
+def other_client(port, interval, ack_delay, duration):
+    busy, quiet = Client(('127.0.0.1', port)), Client(('127.0.0.1', port))
+    start = time.monotonic()
+    next_send = [start]
+    quiet_at = start + duration / 2
+
+    def schedule(now):
+        due = []
+        while now >= next_send[0]:
+            next_send[0] += interval
+            due.append(busy)
+        if not quiet.sent and now >= quiet_at:
+            due.append(quiet)
+        return due
+
+    # the busy client keeps sending past the quiet one's deadline
+    pump([busy, quiet], schedule, start + duration, interval)
+    return quiet.longest_wait()
+
+
+def main(port, interval, ack_delay, duration, slack):
+    limit = ack_delay + slack
+    failed = False
+    with tempfile.TemporaryDirectory() as out_dir:
+        for name, case in (('steady', steady), ('other client', other_client)):
+            receiver = start_receiver(port, ack_delay, out_dir)
+            try:
+                wait = case(port, interval, ack_delay, duration)
+            finally:
+                receiver.send_signal(signal.SIGINT)
+                receiver.communicate(timeout=5)
+            ok = wait is not None and wait <= limit
+            failed |= not ok
+            shown = "never acked" if wait is None else f"longest ack wait {wait * 1000:.1f} ms"
+            print(f"{name:>12}: {shown}, limit {limit * 1000:.1f} ms: {'ok' if ok else 'FAILED'}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="receiver delayed-ack timer check under steady arrivals")
+    parser.add_argument("--port", type=int, default=5013, help="port for the receiver (default %(default)s)")
+    parser.add_argument("--interval", type=float, default=0.0002, metavar="SECONDS",
+                        help="time between segments, below the ack delay (default %(default)s)")
+    parser.add_argument("--ack-delay", type=float, default=0.04, metavar="SECONDS",
+                        help="the receiver's --ack-delay (default %(default)s)")
+    parser.add_argument("--duration", type=float, default=1.0, metavar="SECONDS",
+                        help="how long segments keep arriving (default %(default)s)")
+    parser.add_argument("--slack", type=float, default=0.02, metavar="SECONDS",
+                        help="scheduling allowance on top of the ack delay (default %(default)s)")
+    args = parser.parse_args()
+    main(args.port, args.interval, args.ack_delay, args.duration, args.slack)
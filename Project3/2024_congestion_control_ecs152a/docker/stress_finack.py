@@ -0,0 +1,109 @@
+"""Stress check for the receiver's teardown when the sender's FINACK is lost.
+
+Starts receiver.py for a single transfer, sends a small file in order and
+the empty segment that ends it, then plays the sender's side of the close
+with the first FINACK dropped, as a lossy link would:
+
+* resent: the sender lingers like runtime.py does and answers the
+  receiver's repeated fin with another FINACK;
+* sender gone: the sender exits right after the lost FINACK and never
+  answers again.
+
+Either way the receiver must write out the whole file and exit by itself
+within --limit seconds.
+"""
+import argparse
+import filecmp
+import os
+import select
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from header import StockHeader
+
+SEGMENT = 1020
+
+
+def start_receiver(port, output):
+    receiver = subprocess.Popen([sys.executable, 'receiver.py', '--port', str(port), '--output', output],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    assert receiver.stdout.readline().strip() == "Receiver running", "receiver didn't start"
+    return receiver
+
+
+def wait_for_fin(sock, header, timeout):
+    """True once a fin arrives, False if none does within timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+            return False
+        packet, _ = sock.recvfrom(2048)
+        if packet[header.parse(packet)[3]:] == b'fin':
+            return True
+
+
+def transfer(port, data, answer_again, linger):
+    """send data and the empty segment, drop the first FINACK; returns fins answered after it."""
+    receiver = ('127.0.0.1', port)
+    header = StockHeader()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        for seq_id in range(0, len(data), SEGMENT):
+            sock.sendto(header.pack(seq_id) + data[seq_id:seq_id + SEGMENT], receiver)
+            time.sleep(0.0005)  # well within the receive buffer, nothing is lost on the way in
+        fin = header.pack(len(data))
+        sock.sendto(fin, receiver)
+        assert wait_for_fin(sock, header, 2.0), "receiver never sent its fin"
+        # the FINACK goes nowhere
+        answered = 0
+        while answer_again and wait_for_fin(sock, header, linger):
+            sock.sendto(fin + b'==FINACK==', receiver)
+            answered += 1
+        return answered
+
+
+def main(port, size, linger, limit):
+    data = os.urandom(size)
+    failed = False
+    with tempfile.TemporaryDirectory() as out_dir:
+        source = os.path.join(out_dir, 'in.bin')
+        with open(source, 'wb') as f:
+            f.write(data)
+        for name, answer_again in (('resent', True), ('sender gone', False)):
+            output = os.path.join(out_dir, f"out-{name.replace(' ', '-')}.bin")
+            receiver = start_receiver(port, output)
+            try:
+                answered = transfer(port, data, answer_again, linger)
+                start = time.monotonic()
+                receiver.communicate(timeout=limit)
+                took = time.monotonic() - start
+            except subprocess.TimeoutExpired:
+                receiver.kill()
+                receiver.communicate()
+                took = None
+            complete = os.path.exists(output) and filecmp.cmp(source, output, shallow=False)
+            ok = took is not None and complete
+            failed |= not ok
+            shown = f"hung past {limit:.1f} s" if took is None else f"exited {took:.2f} s after the transfer"
+            written = os.path.getsize(output) if os.path.exists(output) else 0
+            print(f"{name:>12}: {shown}, {written} of {size} bytes written, "
+                  f"{answered} fins answered: {'ok' if ok else 'FAILED'}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="receiver teardown check with a lost FINACK")
+    parser.add_argument("--port", type=int, default=5014, help="port for the receiver (default %(default)s)")
+    parser.add_argument("--size", type=int, default=500_000, metavar="BYTES",
+                        help="bytes to transfer (default %(default)s)")
+    parser.add_argument("--linger", type=float, default=0.2, metavar="SECONDS",
+                        help="how long the sender waits for another fin, runtime.py's shortest rto (default %(default)s)")
+    parser.add_argument("--limit", type=float, default=10.0, metavar="SECONDS",
+                        help="how long the receiver may take to exit after the transfer (default %(default)s)")
+    args = parser.parse_args()
+    main(args.port, args.size, args.linger, args.limit)
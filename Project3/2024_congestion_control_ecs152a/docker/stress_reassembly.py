@@ -0,0 +1,108 @@
+"""Stress check for the receiver's reassembly under heavy reordering.
+
+Feeds a Reassembler random data cut into variable-length segments,
+delivered far out of order, with duplicates and with retransmissions cut
+at different boundaries than the originals. The written file must equal
+the input; with --model the cumulative ack and the sack ranges are also
+checked against a byte-by-byte model after every segment. Cases with a
+small buffer keep resending whatever was dropped until it all arrives,
+like a sender would.
+"""
+import argparse
+import io
+import random
+import time
+
+from reassembly import Reassembler
+
+
+def cut(data, rng, max_size):
+    """split data into (seq_id, payload) segments of random sizes."""
+    segments = []
+    offset = 0
+    while offset < len(data):
+        size = rng.randint(1, max_size)
+        segments.append((offset, data[offset: offset + size]))
+        offset += size
+    return segments
+
+
+def reorder(segments, rng, distance):
+    """shuffle every segment up to distance places away from where it was sent."""
+    keyed = [(i + rng.uniform(0, distance), segment) for i, segment in enumerate(segments)]
+    keyed.sort(key=lambda item: item[0])
+    return [segment for _, segment in keyed]
+
+
+def check(reassembler, received):
+    """compare the cumulative ack and the held ranges against a byte-by-byte model."""
+    expected = 0
+    while expected in received:
+        expected += 1
+    assert reassembler.expected == expected, (reassembler.expected, expected)
+
+    ranges = []
+    for offset in sorted(b for b in received if b > expected):
+        if ranges and ranges[-1][1] == offset:
+            ranges[-1][1] = offset + 1
+        else:
+            ranges.append([offset, offset + 1])
+    assert list(reassembler.ranges) == [tuple(r) for r in ranges], (list(reassembler.ranges), ranges)
+
+
+def run(rng, size, max_segment, distance, capacity, model):
+    data = rng.randbytes(size)
+    out = io.BytesIO()
+    reassembler = Reassembler(out, capacity)
+    received = set()  # bytes the reassembler accepted, for the model check
+
+    segments = cut(data, rng, max_segment)
+    # duplicates, and retransmissions cut at other boundaries than the originals
+    segments += rng.sample(segments, len(segments) // 10)
+    segments += rng.sample(cut(data, rng, max_segment), len(segments) // 10)
+
+    deliveries = 0
+    start = time.perf_counter()
+    while reassembler.expected < size:
+        for seq_id, payload in reorder(segments, rng, distance):
+            deliveries += 1
+            if reassembler.add(seq_id, payload) and model:
+                received.update(range(seq_id, seq_id + len(payload)))
+                check(reassembler, received)
+        # whatever a small buffer dropped goes out again
+        segments = [(seq_id, payload) for seq_id, payload in segments
+                    if not reassembler.ranges.covers(seq_id, seq_id + len(payload))
+                    and seq_id + len(payload) > reassembler.expected]
+    elapsed = time.perf_counter() - start
+
+    assert out.getvalue() == data
+    assert reassembler.buffered == 0 and not reassembler.pending and not len(reassembler.ranges)
+    return deliveries, elapsed
+
+
+def main(seed, rounds, size, model):
+    rng = random.Random(seed)
+    cases = [
+        # max segment, reorder distance, buffer capacity
+        (1020, 50, 1 << 30),
+        (1020, 2000, 1 << 30),
+        (3000, 500, 1 << 30),
+        (1020, 500, 20 * 1020),
+        (700, 5000, 64 * 1024),
+    ]
+    for max_segment, distance, capacity in cases:
+        for _ in range(rounds):
+            deliveries, elapsed = run(rng, size, max_segment, distance, capacity, model)
+        print(f"segments <= {max_segment:5} B, reorder {distance:5}, buffer {min(capacity, size):8} B: "
+              f"ok, {deliveries / elapsed:10.0f} segments/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="receiver reassembly stress check")
+    parser.add_argument("--seed", type=int, default=152, help="random seed (default %(default)s)")
+    parser.add_argument("--rounds", type=int, default=2, help="runs per case (default %(default)s)")
+    parser.add_argument("--size", type=int, default=500_000, help="bytes per run (default %(default)s)")
+    parser.add_argument("--model", action="store_true",
+                        help="check ack and ranges against a byte-by-byte model after every segment (slow, use a small --size)")
+    args = parser.parse_args()
+    main(args.seed, args.rounds, args.size, args.model)
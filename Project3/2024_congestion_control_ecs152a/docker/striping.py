@@ -0,0 +1,47 @@
+"""Striping one file across parallel flows, and merging the flows back.
+
+The sender cuts the file into contiguous ranges on segment boundaries and
+sends each as its own transfer numbered from 0 (see source.RangeSource).
+Each flow's hello carries where its range starts, and the receiver writes
+the flow's in-order bytes from there on in one shared output file.
+"""
+import os
+
+
+def split_ranges(length, streams, segment_size):
+    """(start, end) of each stream's share, segment aligned, none empty unless the file is."""
+    segments = -(-length // segment_size)
+    streams = max(1, min(streams, segments))
+    per_stream, extra = divmod(segments, streams)
+    ranges = []
+    start = 0
+    for i in range(streams):
+        end = min(length, start + (per_stream + (i < extra)) * segment_size)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+class StripeWriter:
+    """A file-like writer for one flow that lands its bytes at base in a shared file.
+
+    base is None until the flow's hello says where its range starts; the
+    receiver doesn't take data before that.
+    """
+
+    def __init__(self, merged):
+        self.merged = merged  # the shared output, opened unbuffered
+        self.base = None
+        self.written = 0
+
+    def write(self, payload):
+        position = self.base + self.written
+        if hasattr(os, 'pwrite'):
+            os.pwrite(self.merged.fileno(), payload, position)
+        else:
+            self.merged.seek(position)
+            self.merged.write(payload)
+        self.written += len(payload)
+
+    def close(self):
+        pass  # the merged file outlives every flow
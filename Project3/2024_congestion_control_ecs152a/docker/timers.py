@@ -0,0 +1,78 @@
+"""Per-segment retransmission timers for the selective-repeat senders."""
+import heapq
+
+# shortest socket timeout handed out, settimeout(0) would make the socket non-blocking
+MIN_WAIT = 0.001
+
+
+class SegmentTimers:
+    """Min-heap of (sent_at, seq_id) so only expired segments are resent.
+
+    A segment expires once sent_at + rto has passed. The rto is passed in
+    on every query instead of being baked into a deadline at send time, so
+    segments sent before the first rtt sample (rto = 1 s) don't outlive the
+    ones sent after it, and a backoff stretches every outstanding timer.
+
+    Entries are cancelled lazily: re-arming a segment or acknowledging it
+    just leaves the old heap entry behind and it is dropped when it reaches
+    the top of the heap.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.sent_at = {}  # seq_id -> time of the live (latest) transmission
+        self.floor = 0  # everything below the cumulative ack is done
+
+    def __len__(self):
+        return sum(1 for seq_id in self.sent_at if seq_id >= self.floor)
+
+    def arm(self, seq_id, sent_at):
+        """start (or restart) the timer for seq_id, sent at sent_at."""
+        self.sent_at[seq_id] = sent_at
+        heapq.heappush(self.heap, (sent_at, seq_id))
+
+    def cancel(self, seq_id):
+        """stop the timer for a single segment."""
+        self.sent_at.pop(seq_id, None)
+
+    def clear(self):
+        """stop every timer, go-back-n re-arms them as it resends."""
+        self.heap.clear()
+        self.sent_at.clear()
+
+    def ack_below(self, ack_id):
+        """stop every timer for segments before the cumulative ack_id."""
+        self.floor = max(self.floor, ack_id)
+
+    def next_deadline(self, rto):
+        """earliest expiry time, or None when nothing is outstanding."""
+        self._prune()
+        return self.heap[0][0] + rto if self.heap else None
+
+    def wait_time(self, now, rto):
+        """how long a blocking recv may wait before the next timer fires."""
+        deadline = self.next_deadline(rto)
+        if deadline is None:
+            return rto
+        return max(deadline - now, MIN_WAIT)
+
+    def pop_expired(self, now, rto):
+        """remove and return the seq ids whose timers have fired, oldest first."""
+        expired = []
+        self._prune()
+        while self.heap and self.heap[0][0] + rto <= now:
+            _, seq_id = heapq.heappop(self.heap)
+            del self.sent_at[seq_id]
+            expired.append(seq_id)
+            self._prune()
+        return expired
+
+    def _prune(self):
+        heap = self.heap
+        while heap:
+            sent_at, seq_id = heap[0]
+            if seq_id < self.floor:
+                self.sent_at.pop(seq_id, None)
+            elif self.sent_at.get(seq_id) == sent_at:
+                return
+            heapq.heappop(heap)